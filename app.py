@@ -1,21 +1,36 @@
-from flask import Flask, request, render_template_string, send_file, flash, redirect, url_for, session
+from flask import Flask, request, render_template_string, send_file, flash, redirect, url_for, session, Response, stream_with_context, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-import qrcode
+import click
+import db_config
+import qr_payload
+import qr_render
 import json
+import multiprocessing
 import os
+import socket
 import csv
+import itertools
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO, StringIO
+import tempfile
+import zipfile
+from urllib.parse import quote
+from markupsafe import escape
 from datetime import datetime, timedelta
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key_here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///railway_fittings.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db_config.init_app(app, 'railway_fittings.db', 'RAILWAY_DATABASE_URL')
 db = SQLAlchemy(app)
+# Inspections from many handhelds are committed in groups when enabled
+group_committer = db_config.GroupCommitter(app, db) if os.environ.get('DB_GROUP_COMMIT') == '1' else None
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
@@ -23,14 +38,76 @@ login_manager.login_view = 'login'
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+FITTING_TYPES = ('elastic_rail_clip', 'rail_pad', 'liner', 'sleeper')
+
 class Fitting(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     fitting_type = db.Column(db.String(50), nullable=False)  # elastic_rail_clip, rail_pad, liner, sleeper
     vendor_lot = db.Column(db.String(100), nullable=False)
     supply_date = db.Column(db.Date, nullable=False)
     warranty_period = db.Column(db.Integer, nullable=False)  # in months
-    inspection_dates = db.Column(db.Text, nullable=True)  # JSON list of dates
-    qr_data = db.Column(db.Text, nullable=False)  # JSON string
+    inspection_dates = db.Column(db.Text, nullable=True)  # legacy JSON list, moved to Inspection on startup
+    qr_data = db.Column(db.Text, nullable=False)  # printed payload, see qr_payload (older rows hold JSON)
+    warranty_end = db.Column(db.Date, index=True)  # supply_date + warranty_period * 30 days
+    last_inspection = db.Column(db.Date, index=True)  # latest Inspection.date, for overdue queries
+    # Inventory filters page through id, so every filter index ends with id
+    __table_args__ = (
+        db.Index('ix_fitting_type_id', 'fitting_type', 'id'),
+        db.Index('ix_fitting_vendor_lot_id', 'vendor_lot', 'id'),
+        db.Index('ix_fitting_supply_date_id', 'supply_date', 'id'),
+        # Legacy JSON QR codes carry no id and are resolved through these fields
+        db.Index('ix_fitting_lot_date_type', 'vendor_lot', 'supply_date', 'fitting_type'),
+    )
+
+class Inspection(db.Model):
+    # Append-only inspection history, one row per inspection
+    id = db.Column(db.Integer, primary_key=True)
+    fitting_id = db.Column(db.Integer, db.ForeignKey('fitting.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    inspector_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    __table_args__ = (db.Index('ix_inspection_fitting_date', 'fitting_id', 'date'),)
+
+class FittingSummary(db.Model):
+    # Materialized counts for /reports, kept up to date by summary_add
+    __tablename__ = 'fitting_summary'
+    fitting_type = db.Column(db.String(50), primary_key=True)
+    vendor_lot = db.Column(db.String(100), primary_key=True)
+    supply_month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    fittings = db.Column(db.Integer, nullable=False, default=0)
+    inspections = db.Column(db.Integer, nullable=False, default=0)
+
+class Alert(db.Model):
+    # Precomputed by refresh_alerts; the dashboard only reads this table.
+    # reference_date is the warranty end for 'warranty' alerts and the last
+    # inspection (or supply date) for 'inspection' alerts.
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    fitting_id = db.Column(db.Integer, db.ForeignKey('fitting.id'), nullable=False)
+    fitting_type = db.Column(db.String(50), nullable=False)
+    vendor_lot = db.Column(db.String(100), nullable=False)
+    reference_date = db.Column(db.Date, nullable=False)
+    __table_args__ = (db.Index('ix_alert_kind_id', 'kind', 'id'),)
+
+class AlertRun(db.Model):
+    __tablename__ = 'alert_run'
+    id = db.Column(db.Integer, primary_key=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+    warranty_days = db.Column(db.Integer, nullable=False)
+    warranty_alerts = db.Column(db.Integer, nullable=False)
+    inspection_alerts = db.Column(db.Integer, nullable=False)
+
+class ExportJob(db.Model):
+    __tablename__ = 'export_job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # inventory, reports
+    args = db.Column(db.Text)  # JSON of the inventory filters
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+    rows = db.Column(db.Integer, default=0)
+    message = db.Column(db.String(500))
+    worker = db.Column(db.String(100))  # host:pid of the process whose thread runs the export
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -44,9 +121,144 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+def warranty_end_for(supply_date, warranty_period):
+    return supply_date + timedelta(days=warranty_period * 30)
+
+INSPECTION_INTERVAL_DAYS = 182
+
+def parse_dates(text):
+    # "2024-01-05, 2024-06-01" (or ; separated) -> dates; raises ValueError
+    dates = []
+    for part in (text or '').replace(';', ',').split(','):
+        part = part.strip()
+        if part:
+            try:
+                dates.append(datetime.strptime(part, '%Y-%m-%d').date())
+            except ValueError:
+                raise ValueError(f'inspection date {part!r} is not YYYY-MM-DD')
+    return dates
+
+def overdue_filter(today=None):
+    # Fittings whose last inspection (or supply, if never inspected) is older
+    # than the inspection interval; both sides are index range scans
+    cutoff = (today or datetime.now().date()) - timedelta(days=INSPECTION_INTERVAL_DAYS)
+    return db.or_(Fitting.last_inspection < cutoff,
+                  db.and_(Fitting.last_inspection.is_(None), Fitting.supply_date < cutoff))
+
+def summary_add(fitting_type, vendor_lot, supply_date, fittings=0, inspections=0):
+    # Incremental update of the report summary, called on insert and inspection
+    db.session.execute(db.text(
+        'INSERT INTO fitting_summary (fitting_type, vendor_lot, supply_month, fittings, inspections) '
+        'VALUES (:fitting_type, :vendor_lot, :supply_month, :fittings, :inspections) '
+        'ON CONFLICT (fitting_type, vendor_lot, supply_month) DO UPDATE SET '
+        'fittings = fitting_summary.fittings + excluded.fittings, '
+        'inspections = fitting_summary.inspections + excluded.inspections'
+    ), {'fitting_type': fitting_type, 'vendor_lot': vendor_lot, 'supply_month': supply_date.strftime('%Y-%m'),
+        'fittings': fittings, 'inspections': inspections})
+
+def backfill_warranty_end(chunk_size=10000):
+    while True:
+        rows = (db.session.query(Fitting.id, Fitting.supply_date, Fitting.warranty_period)
+                .filter(Fitting.warranty_end.is_(None)).limit(chunk_size).all())
+        if not rows:
+            return
+        db.session.execute(
+            db.text('UPDATE fitting SET warranty_end = :warranty_end WHERE id = :id'),
+            [{'id': r.id, 'warranty_end': warranty_end_for(r.supply_date, r.warranty_period)} for r in rows]
+        )
+        db.session.commit()
+
+def migrate_inspection_blobs(chunk_size=5000):
+    # Moves Fitting.inspection_dates JSON into Inspection rows; a migrated
+    # fitting has its blob cleared, so this resumes where it stopped
+    skipped = 0
+    while True:
+        rows = (db.session.query(Fitting.id, Fitting.inspection_dates)
+                .filter(Fitting.inspection_dates.isnot(None)).limit(chunk_size).all())
+        if not rows:
+            break
+        inspections, updates = [], []
+        for r in rows:
+            dates = []
+            for value in json.loads(r.inspection_dates or '[]'):
+                try:
+                    dates.append(datetime.strptime(str(value).strip(), '%Y-%m-%d').date())
+                except ValueError:
+                    skipped += 1
+            inspections.extend({'fitting_id': r.id, 'date': d} for d in dates)
+            updates.append({'fitting_id': r.id, 'last_inspection': max(dates) if dates else None})
+        if inspections:
+            db.session.execute(Inspection.__table__.insert(), inspections)
+        db.session.execute(
+            db.text('UPDATE fitting SET inspection_dates = NULL, last_inspection = :last_inspection WHERE id = :fitting_id'),
+            updates
+        )
+        db.session.commit()
+    if skipped:
+        app.logger.warning('Skipped %d unparseable inspection dates while migrating', skipped)
+
+def rebuild_summary():
+    # Full recount; only needed when the summary table is first created
+    db.session.query(FittingSummary).delete()
+    counts = {}
+    rows = (db.session.query(Fitting.fitting_type, Fitting.vendor_lot, Fitting.supply_date, db.func.count(Inspection.id))
+            .outerjoin(Inspection, Inspection.fitting_id == Fitting.id).group_by(Fitting.id))
+    for fitting_type, vendor_lot, supply_date, inspections in rows.yield_per(10000):
+        key = (fitting_type, vendor_lot, supply_date.strftime('%Y-%m'))
+        entry = counts.setdefault(key, [0, 0])
+        entry[0] += 1
+        entry[1] += inspections
+    db.session.add_all(FittingSummary(fitting_type=t, vendor_lot=lot, supply_month=month, fittings=n, inspections=i)
+                       for (t, lot, month), (n, i) in counts.items())
+    db.session.commit()
+
+# Background exports run on a thread of the process that queued them, so a
+# job whose process is gone will never finish
+EXPORT_WORKER = f'{socket.gethostname()}:{os.getpid()}'
+EXPORT_WORKER_STARTED = datetime.now()
+
+def export_orphaned(job):
+    # Only processes on this host can be checked; jobs from before the worker
+    # column was added cannot have survived a restart
+    if not job.worker:
+        return True
+    host, _, pid = job.worker.rpartition(':')
+    if host != socket.gethostname():
+        return False
+    if int(pid) == os.getpid():
+        # A recycled pid, as containers give after a restart, is told apart by age
+        return job.created_at < EXPORT_WORKER_STARTED
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+def fail_export(job):
+    job.status, job.finished_at = 'failed', datetime.now()
+    job.message = 'The server restarted before the export finished. Start it again.'
+
+def fail_orphaned_exports():
+    for job in ExportJob.query.filter(ExportJob.status.in_(('queued', 'running'))):
+        if export_orphaned(job):
+            fail_export(job)
+    db.session.commit()
+
 def setup_database():
     with app.app_context():
         db.create_all()
+        db_config.add_missing_columns(db, Fitting)
+        db_config.add_missing_columns(db, ExportJob)
+        # create_all skips tables that already exist, so indexes are added separately
+        for index in Fitting.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        backfill_warranty_end()
+        migrate_inspection_blobs()
+        if not FittingSummary.query.first() and Fitting.query.first():
+            rebuild_summary()
+        fail_orphaned_exports()
         if not User.query.filter_by(username='admin').first():
             admin = User(username='admin', role='admin')
             admin.set_password('admin123')
@@ -56,7 +268,10 @@ def setup_database():
             db.session.add(inspector)
             db.session.commit()
 
-setup_database()
+# Render pool workers are spawned and re-import this module as __mp_main__
+# under `python app.py`; only the serving process migrates the database.
+if multiprocessing.parent_process() is None:
+    setup_database()
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -93,9 +308,13 @@ th { background-color: #004c4c; }
 <div class="nav">
 <a href="/">Home</a>
 <a href="/generate_qr">Generate QR</a>
+<a href="/batch_qr">Batch QR</a>
 <a href="/scan_qr">Scan QR</a>
+<a href="/inspections">Inspections</a>
 <a href="/inventory">Inventory</a>
+<a href="/import_csv">Import CSV</a>
 <a href="/reports">Reports</a>
+<a href="/alerts">Alerts</a>
 </div>
 {% with messages = get_flashed_messages(with_categories=true) %}
 {% if messages %}
@@ -167,38 +386,33 @@ def generate_qr():
         vendor_lot = request.form['vendor_lot']
         supply_date_str = request.form['supply_date']
         warranty_period = int(request.form['warranty_period'])
-        inspection_dates = request.form.get('inspection_dates', '')
+        try:
+            inspection_dates = parse_dates(request.form.get('inspection_dates', ''))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('generate_qr'))
 
         supply_date = datetime.strptime(supply_date_str, '%Y-%m-%d').date()
-        qr_data = {
-            'fitting_type': fitting_type,
-            'vendor_lot': vendor_lot,
-            'supply_date': supply_date_str,
-            'warranty_period': warranty_period,
-            'inspection_dates': inspection_dates.split(',') if inspection_dates else []
-        }
 
         fitting = Fitting(
             fitting_type=fitting_type,
             vendor_lot=vendor_lot,
             supply_date=supply_date,
             warranty_period=warranty_period,
-            inspection_dates=json.dumps(qr_data['inspection_dates']),
-            qr_data=json.dumps(qr_data)
+            qr_data='',
+            warranty_end=warranty_end_for(supply_date, warranty_period),
+            last_inspection=max(inspection_dates) if inspection_dates else None
         )
         db.session.add(fitting)
+        # The compact payload needs the id, so it is filled in after the flush
+        db.session.flush()
+        fitting.qr_data = qr_payload.encode(fitting.id)
+        db.session.add_all(Inspection(fitting_id=fitting.id, date=d) for d in inspection_dates)
+        summary_add(fitting_type, vendor_lot, supply_date, fittings=1, inspections=len(inspection_dates))
         db.session.commit()
 
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(json.dumps(qr_data))
-        qr.make(fit=True)
-        img = qr.make_image(fill='black', back_color='white')
-
-        img_io = BytesIO()
-        img.save(img_io, 'PNG')
-        img_io.seek(0)
-
-        return send_file(img_io, mimetype='image/png', as_attachment=True, download_name=f'qr_{fitting.id}.png')
+        _, path = qr_cache.fetch(fitting.qr_data)
+        return send_file(path, mimetype='image/png', as_attachment=True, download_name=f'qr_{fitting.id}.png')
 
     content = '''
     <h2>Generate QR Code for Fitting</h2>
@@ -223,28 +437,169 @@ def generate_qr():
     '''
     return render_template_string(HTML_TEMPLATE, content=content)
 
+FITTING_ID_MAX = 2 ** 63 - 1  # SQLite INTEGER range; larger ids cannot be bound in a query
+SCAN_CACHE_SIZE = 4096
+SCAN_CACHE_TTL = 30  # seconds; bounds staleness for changes made by other processes
+
+class FittingCache:
+    # Small LRU of recently scanned fittings as plain dicts, shared by request
+    # threads. Writers in this process call invalidate; entries from elsewhere
+    # expire after the TTL.
+    def __init__(self, size=SCAN_CACHE_SIZE, ttl=SCAN_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, fitting_id):
+        with self.lock:
+            entry = self.entries.get(fitting_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self.entries.move_to_end(fitting_id)
+            return entry[1]
+
+    def put(self, fitting_id, fitting):
+        with self.lock:
+            self.entries[fitting_id] = (time.monotonic() + self.ttl, fitting)
+            self.entries.move_to_end(fitting_id)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, fitting_id):
+        with self.lock:
+            self.entries.pop(fitting_id, None)
+
+fitting_cache = FittingCache()
+
+def fitting_record(fitting):
+    return {
+        'id': fitting.id,
+        'fitting_type': fitting.fitting_type,
+        'vendor_lot': fitting.vendor_lot,
+        'supply_date': fitting.supply_date.isoformat(),
+        'warranty_period': fitting.warranty_period,
+        'warranty_end': fitting.warranty_end.isoformat() if fitting.warranty_end else None,
+        'inspection_dates': inspections_for([fitting.id]).get(fitting.id, [])
+    }
+
+def inspections_for(fitting_ids):
+    # {fitting id: [ISO dates]} for a page of fittings, one indexed query
+    dates = {}
+    rows = (db.session.query(Inspection.fitting_id, Inspection.date)
+            .filter(Inspection.fitting_id.in_(fitting_ids)).order_by(Inspection.fitting_id, Inspection.date))
+    for fitting_id, date in rows:
+        dates.setdefault(fitting_id, []).append(date.isoformat())
+    return dates
+
+def write_inspections(entries, inspector_id=None):
+    # Appends (fitting_id, date) inspections for existing fittings and
+    # updates last_inspection and the report summary, without committing
+    fitting_ids = {fitting_id for fitting_id, _ in entries}
+    fittings = {f.id: f for f in db.session.query(Fitting.id, Fitting.fitting_type, Fitting.vendor_lot, Fitting.supply_date)
+                .filter(Fitting.id.in_(fitting_ids))}
+    db.session.execute(Inspection.__table__.insert(),
+                       [{'fitting_id': f, 'date': d, 'inspector_id': inspector_id} for f, d in entries])
+    latest, groups = {}, {}
+    for fitting_id, date in entries:
+        latest[fitting_id] = max(date, latest.get(fitting_id, date))
+        f = fittings[fitting_id]
+        key = (f.fitting_type, f.vendor_lot, f.supply_date.replace(day=1))
+        groups[key] = groups.get(key, 0) + 1
+    db.session.execute(
+        db.text('UPDATE fitting SET last_inspection = :date WHERE id = :fitting_id '
+                'AND (last_inspection IS NULL OR last_inspection < :date)'),
+        [{'fitting_id': f, 'date': d} for f, d in latest.items()]
+    )
+    for (fitting_type, vendor_lot, month), count in groups.items():
+        summary_add(fitting_type, vendor_lot, month, inspections=count)
+    return list(latest)
+
+def record_inspections(entries, inspector_id=None):
+    if group_committer:
+        fitting_ids = group_committer.submit(write_inspections, entries, inspector_id).result()
+    else:
+        fitting_ids = write_inspections(entries, inspector_id)
+        db.session.commit()
+    for fitting_id in fitting_ids:
+        fitting_cache.invalidate(fitting_id)
+
+def get_fitting(fitting_id):
+    # Primary key lookup through the hot-row cache
+    record = fitting_cache.get(fitting_id)
+    if record is None:
+        fitting = db.session.get(Fitting, fitting_id)
+        if fitting is None:
+            return None
+        record = fitting_record(fitting)
+        fitting_cache.put(fitting_id, record)
+    return record
+
+def resolve_scan(qr_text):
+    # Stored fitting for a scanned payload; raises ValueError if it cannot be resolved
+    version, data = qr_payload.decode(qr_text)
+    if version != qr_payload.LEGACY_VERSION:
+        if data > FITTING_ID_MAX:
+            raise ValueError(f'fitting {data} does not exist')
+        record = get_fitting(data)
+        if record is None:
+            raise ValueError(f'fitting {data} does not exist')
+        return record
+    fields = [data.get(name) for name in ('vendor_lot', 'supply_date', 'fitting_type')]
+    if not all(isinstance(value, str) for value in fields):
+        raise ValueError('legacy QR payload has missing or non-text fields')
+    vendor_lot, supply_date, fitting_type = fields
+    supply_date = datetime.strptime(supply_date, '%Y-%m-%d').date()
+    candidates = (db.session.query(Fitting.id, Fitting.qr_data)
+                  .filter_by(vendor_lot=vendor_lot, supply_date=supply_date, fitting_type=fitting_type)
+                  .order_by(Fitting.id).limit(100).all())
+    if not candidates:
+        raise ValueError('no stored fitting matches this QR code')
+    # Fittings of one lot share most fields; prefer the one printed with this exact payload
+    normalized = json.dumps(data)
+    fitting_id = next((c.id for c in candidates if c.qr_data == normalized), candidates[0].id)
+    return get_fitting(fitting_id)
+
+def fitting_details(fitting):
+    inspections = fitting['inspection_dates']
+    return f'''
+            <h2>Scanned Fitting Details</h2>
+            <p><strong>Fitting ID:</strong> {fitting['id']}</p>
+            <p><strong>Type:</strong> {escape(fitting['fitting_type'])}</p>
+            <p><strong>Vendor Lot:</strong> {escape(fitting['vendor_lot'])}</p>
+            <p><strong>Supply Date:</strong> {fitting['supply_date']}</p>
+            <p><strong>Warranty Period:</strong> {fitting['warranty_period']} months</p>
+            <p><strong>Warranty Ends:</strong> {fitting['warranty_end']}</p>
+            <p><strong>Inspection Dates:</strong> {escape(', '.join(inspections)) if inspections else 'None'}</p>
+            '''
+
+QR_CACHE_MAX_AGE = 24 * 60 * 60
+qr_cache = qr_render.ImageCache(os.path.join(app.instance_path, 'qr_cache'))
+
+@app.route('/qr/<int:fitting_id>.png')
+def qr_image(fitting_id):
+    # Serves the fitting's printed code from the image cache; the ETag is the
+    # content hash, so unchanged codes revalidate with a 304
+    qr_data = db.session.query(Fitting.qr_data).filter(Fitting.id == fitting_id).scalar()
+    if qr_data is None:
+        return 'Fitting not found', 404
+    key, path = qr_cache.fetch(qr_data)
+    return send_file(path, mimetype='image/png', etag=key, max_age=QR_CACHE_MAX_AGE, conditional=True)
+
 @app.route('/scan_qr', methods=['GET', 'POST'])
 def scan_qr():
     if request.method == 'POST':
         qr_text = request.form['qr_text']
         try:
-            qr_data = json.loads(qr_text)
-            content = f'''
-            <h2>Scanned Fitting Details</h2>
-            <p><strong>Type:</strong> {qr_data['fitting_type']}</p>
-            <p><strong>Vendor Lot:</strong> {qr_data['vendor_lot']}</p>
-            <p><strong>Supply Date:</strong> {qr_data['supply_date']}</p>
-            <p><strong>Warranty Period:</strong> {qr_data['warranty_period']} months</p>
-            <p><strong>Inspection Dates:</strong> {', '.join(qr_data['inspection_dates']) if qr_data['inspection_dates'] else 'None'}</p>
-            '''
+            content = fitting_details(resolve_scan(qr_text))
             flash('QR scanned successfully!', 'success')
-        except json.JSONDecodeError:
-            content = '<h2>Error</h2><p>Invalid QR data.</p>'
+        except ValueError as e:
+            content = f'<h2>Error</h2><p>Invalid QR data: {escape(str(e))}</p>'
             flash('Invalid QR data.', 'error')
     else:
         content = '''
         <h2>Scan QR Code</h2>
-        <p>Simulate scanning by pasting the QR data (JSON string):</p>
+        <p>Simulate scanning by pasting the QR data (compact code such as RF1:1A:7K, or the JSON of older codes):</p>
         <form method="post">
             <label>QR Data:</label>
             <textarea name="qr_text" rows="10" required></textarea>
@@ -253,59 +608,884 @@ def scan_qr():
         '''
     return render_template_string(HTML_TEMPLATE, content=content)
 
+@app.route('/api/scan', methods=['GET', 'POST'])
+def api_scan():
+    # For handheld scanners: ?qr=<payload> or a JSON body {"qr": "<payload>"}
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({'error': 'JSON body must be an object'}), 400
+    qr_text = request.args.get('qr') or body.get('qr')
+    if not isinstance(qr_text, str) or not qr_text:
+        return jsonify({'error': 'qr is required'}), 400
+    try:
+        return jsonify(resolve_scan(qr_text))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+
+INSPECTION_BATCH_LIMIT = 10000
+
+def parse_inspection_entry(fitting, date_text, today):
+    # (fitting_id, date) for an id or scanned QR code and an optional date; raises ValueError.
+    # JSON entries can carry any type, so anything but text and whole numbers is rejected here.
+    if isinstance(fitting, bool) or not isinstance(fitting, (int, str)):
+        raise ValueError('fitting must be an id or QR code text')
+    if date_text is not None and not isinstance(date_text, str):
+        raise ValueError('date must be YYYY-MM-DD text')
+    fitting = str(fitting).strip()
+    fitting_id = int(fitting) if fitting.isdigit() else resolve_scan(fitting)['id']
+    if not 0 < fitting_id <= FITTING_ID_MAX:
+        raise ValueError(f'fitting {fitting_id} does not exist')
+    date = datetime.strptime(date_text.strip(), '%Y-%m-%d').date() if date_text and date_text.strip() else today
+    if date > today:
+        raise ValueError(f'inspection date {date} is in the future')
+    return fitting_id, date
+
+@app.route('/inspections', methods=['GET', 'POST'])
+@login_required
+def inspections():
+    # Bulk recording: one "fitting id or QR code[, YYYY-MM-DD]" per line in the
+    # form, or {"inspections": [{"fitting_id" or "qr": ..., "date": ...}]} as JSON
+    if request.method == 'POST':
+        today = datetime.now().date()
+        if request.is_json:
+            body = request.get_json(silent=True)
+            if body is None:
+                return jsonify({'error': 'invalid JSON body'}), 400
+            if not isinstance(body, dict):
+                return jsonify({'error': 'JSON body must be an object'}), 400
+            items = body.get('inspections') or []
+            if not isinstance(items, list):
+                return jsonify({'error': 'inspections must be a list'}), 400
+            items = [(i.get('fitting_id') or i.get('qr') or '', i.get('date')) if isinstance(i, dict) else ('', None)
+                     for i in items]
+        else:
+            items = [tuple(line.split(',', 1)) if ',' in line else (line, None)
+                     for line in request.form.get('entries', '').splitlines() if line.strip()]
+        entries, errors = [], []
+        if len(items) > INSPECTION_BATCH_LIMIT:
+            errors.append((0, f'at most {INSPECTION_BATCH_LIMIT} inspections per request'))
+            items = []
+        for number, (fitting, date_text) in enumerate(items, 1):
+            try:
+                entries.append((number, parse_inspection_entry(fitting, date_text, today)))
+            except ValueError as e:
+                errors.append((number, str(e)))
+        known = {f for (f,) in db.session.query(Fitting.id).filter(Fitting.id.in_({e[0] for _, e in entries}))}
+        errors.extend((number, f'fitting {entry[0]} does not exist') for number, entry in entries if entry[0] not in known)
+        entries = [entry for _, entry in entries if entry[0] in known]
+        if entries:
+            record_inspections(entries, current_user.id)
+        if request.is_json:
+            return jsonify({'recorded': len(entries), 'errors': [{'entry': n, 'error': m} for n, m in sorted(errors)]})
+        flash(f'{len(entries)} inspections recorded, {len(errors)} rejected.', 'success' if not errors else 'error')
+        content = '<h2>Record Inspections</h2>'
+        if errors:
+            content += '<table><tr><th>Line</th><th>Error</th></tr>'
+            content += ''.join(f'<tr><td>{n}</td><td>{escape(m)}</td></tr>' for n, m in sorted(errors))
+            content += '</table>'
+        content += '<p><a href="/inspections">Record more</a></p>'
+        return render_template_string(HTML_TEMPLATE, content=content)
+
+    content = '''
+    <h2>Record Inspections</h2>
+    <p>One fitting per line: fitting ID or scanned QR code, optionally followed by a comma and the inspection date (YYYY-MM-DD, default today).</p>
+    <form method="post">
+        <label>Inspections:</label>
+        <textarea name="entries" rows="15" required></textarea>
+        <button type="submit">Record</button>
+    </form>
+    '''
+    return render_template_string(HTML_TEMPLATE, content=content)
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_MAX_REPORTED_ERRORS = 100
+IMPORT_COLUMNS = ('fitting_type', 'vendor_lot', 'supply_date', 'warranty_period')
+
+def parse_fitting_row(row):
+    # Validated insert parameters and inspection dates for one CSV row; raises ValueError with the reason
+    missing = [name for name in IMPORT_COLUMNS if not (row.get(name) or '').strip()]
+    if missing:
+        raise ValueError(f'missing {", ".join(missing)}')
+    fitting_type = row['fitting_type'].strip()
+    if fitting_type not in FITTING_TYPES:
+        raise ValueError(f'unknown fitting_type {fitting_type!r}')
+    supply_date_str = row['supply_date'].strip()
+    try:
+        supply_date = datetime.strptime(supply_date_str, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'supply_date {supply_date_str!r} is not YYYY-MM-DD')
+    try:
+        warranty_period = int(row['warranty_period'])
+    except ValueError:
+        raise ValueError(f'warranty_period {row["warranty_period"]!r} is not a whole number of months')
+    if warranty_period <= 0:
+        raise ValueError('warranty_period must be positive')
+    inspection_dates = parse_dates(row.get('inspection_dates'))
+    return {
+        'fitting_type': fitting_type,
+        'vendor_lot': row['vendor_lot'].strip(),
+        'supply_date': supply_date,
+        'warranty_period': warranty_period,
+        'qr_data': '',
+        'warranty_end': warranty_end_for(supply_date, warranty_period),
+        'last_inspection': max(inspection_dates) if inspection_dates else None
+    }, inspection_dates
+
+def insert_fitting_batch(batch):
+    fitting_table = Fitting.__table__
+    ids = db.session.execute(
+        fitting_table.insert().returning(fitting_table.c.id, sort_by_parameter_order=True), [r for r, _ in batch]
+    ).scalars().all()
+    inspections = [{'fitting_id': fitting_id, 'date': d} for fitting_id, (_, dates) in zip(ids, batch) for d in dates]
+    if inspections:
+        db.session.execute(Inspection.__table__.insert(), inspections)
+    # QR payloads are derived from the ids the insert assigned
+    db.session.execute(
+        fitting_table.update().where(fitting_table.c.id == db.bindparam('fitting_id')).values(qr_data=db.bindparam('payload')),
+        [{'fitting_id': fitting_id, 'payload': qr_payload.encode(fitting_id)} for fitting_id in ids]
+    )
+    groups = {}
+    for r, dates in batch:
+        key = (r['fitting_type'], r['vendor_lot'], r['supply_date'].replace(day=1))
+        entry = groups.setdefault(key, [0, 0])
+        entry[0] += 1
+        entry[1] += len(dates)
+    for (fitting_type, vendor_lot, month), (fittings, inspections) in groups.items():
+        summary_add(fitting_type, vendor_lot, month, fittings=fittings, inspections=inspections)
+    db.session.commit()
+
+def utf8_lines(stream):
+    # Decodes a binary file line by line, so a bad byte is reported on its own
+    # line instead of somewhere in a read-ahead buffer
+    for line in stream:
+        yield line.decode('utf-8-sig')
+
+def import_fittings(lines, batch_size=IMPORT_BATCH_SIZE):
+    # Streams CSV lines into the fittings table batch by batch. Returns the
+    # number of rows imported and (line number, reason) for rejected rows;
+    # a failed batch is rolled back and reported against each of its rows.
+    # A file that stops decoding or parsing ends the import at that line,
+    # keeping the rows before it.
+    reader = csv.DictReader(lines)
+    imported = 0
+    errors = []
+    batch, batch_lines = [], []
+    def flush():
+        nonlocal imported
+        try:
+            insert_fitting_batch(batch)
+            imported += len(batch)
+        except Exception as e:
+            db.session.rollback()
+            errors.extend((line, f'batch insert failed: {e}') for line in batch_lines)
+        batch.clear()
+        batch_lines.clear()
+    try:
+        missing = [name for name in IMPORT_COLUMNS if name not in (reader.fieldnames or [])]
+        if missing:
+            return 0, [(1, f'header is missing {", ".join(missing)}')]
+        for row in reader:
+            try:
+                batch.append(parse_fitting_row(row))
+                batch_lines.append(reader.line_num)
+            except ValueError as e:
+                errors.append((reader.line_num, str(e)))
+            if len(batch) >= batch_size:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        reason = 'is not UTF-8 text' if isinstance(e, UnicodeDecodeError) else f'is not valid CSV ({e})'
+        if batch:
+            flush()
+        errors.append((reader.line_num + 1, f'import stopped: the file {reason} here; '
+                                            f'{imported} rows before this line were imported'))
+        return imported, errors
+    if batch:
+        flush()
+    return imported, errors
+
+@app.route('/import_csv', methods=['GET', 'POST'])
+@login_required
+def import_csv():
+    if current_user.role != 'admin':
+        flash('Only admins can import fittings.', 'error')
+        return redirect(url_for('home'))
+    content = '''
+    <h2>Import Fittings from CSV</h2>
+    <p>Columns: fitting_type, vendor_lot, supply_date (YYYY-MM-DD), warranty_period (months), inspection_dates (optional, separated by ;)</p>
+    <form method="post" enctype="multipart/form-data">
+        <label>CSV File:</label>
+        <input type="file" name="file" accept=".csv" required>
+        <label>Batch Size:</label>
+        <input type="number" name="batch_size" value="{batch_size}" min="1">
+        <button type="submit">Import</button>
+    </form>
+    '''.format(batch_size=IMPORT_BATCH_SIZE)
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV file to import.', 'error')
+            return redirect(url_for('import_csv'))
+        try:
+            batch_size = max(1, int(request.form.get('batch_size') or IMPORT_BATCH_SIZE))
+        except ValueError:
+            flash('Batch size must be a number.', 'error')
+            return redirect(url_for('import_csv'))
+        # The upload is parsed straight from its stream, never read into memory whole
+        imported, errors = import_fittings(utf8_lines(upload.stream), batch_size)
+        flash(f'{imported} fittings imported, {len(errors)} rows rejected.', 'success' if not errors else 'error')
+        if errors:
+            content += '<table><tr><th>Line</th><th>Error</th></tr>'
+            for line, message in errors[:IMPORT_MAX_REPORTED_ERRORS]:
+                content += f'<tr><td>{line}</td><td>{escape(message)}</td></tr>'
+            content += '</table>'
+            if len(errors) > IMPORT_MAX_REPORTED_ERRORS:
+                content += f'<p>Showing the first {IMPORT_MAX_REPORTED_ERRORS} of {len(errors)} errors.</p>'
+    return render_template_string(HTML_TEMPLATE, content=content)
+
+@app.cli.command('import-csv')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Rows per executemany batch.')
+def import_csv_command(path, batch_size):
+    """Import fittings from a vendor CSV file."""
+    with open(path, 'rb') as f:
+        imported, errors = import_fittings(utf8_lines(f), batch_size)
+    for line, message in errors:
+        click.echo(f'line {line}: {message}', err=True)
+    click.echo(f'{imported} fittings imported, {len(errors)} rows rejected.')
+
+INVENTORY_PAGE_SIZE = 50
+INVENTORY_MAX_PAGE_SIZE = 500
+INVENTORY_CHUNK_SIZE = 1000
+INVENTORY_COLUMNS = ('id', 'fitting_type', 'vendor_lot', 'supply_date', 'warranty_period')
+
+def inventory_query(args):
+    # Filters from the query string; raises ValueError on bad dates
+    query = db.session.query(*(getattr(Fitting, name) for name in INVENTORY_COLUMNS))
+    if args.get('fitting_type'):
+        query = query.filter(Fitting.fitting_type == args['fitting_type'])
+    if args.get('vendor_lot'):
+        query = query.filter(Fitting.vendor_lot == args['vendor_lot'])
+    if args.get('supplied_from'):
+        query = query.filter(Fitting.supply_date >= datetime.strptime(args['supplied_from'], '%Y-%m-%d').date())
+    if args.get('supplied_to'):
+        query = query.filter(Fitting.supply_date <= datetime.strptime(args['supplied_to'], '%Y-%m-%d').date())
+    if args.get('overdue'):
+        query = query.filter(overdue_filter())
+    return query.order_by(Fitting.id)
+
+def inventory_pages(query, after=0, size=INVENTORY_CHUNK_SIZE):
+    # Keyset pagination: each page starts after the last id of the previous one
+    while True:
+        rows = query.filter(Fitting.id > after).limit(size).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1].id
+
+def inventory_csv(query):
+    yield ','.join(INVENTORY_COLUMNS + ('inspection_dates',)) + '\n'
+    for rows in inventory_pages(query):
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        inspections = inspections_for([f.id for f in rows])
+        for f in rows:
+            writer.writerow([f.id, f.fitting_type, f.vendor_lot, f.supply_date, f.warranty_period,
+                             ';'.join(inspections.get(f.id, []))])
+        yield buffer.getvalue()
+
 @app.route('/inventory')
 def inventory():
-    fittings = Fitting.query.all()
-    content = '<h2>Fittings Inventory</h2>'
+    try:
+        query = inventory_query(request.args)
+        after = int(request.args.get('after', 0))
+        limit = max(1, min(int(request.args.get('limit', INVENTORY_PAGE_SIZE)), INVENTORY_MAX_PAGE_SIZE))
+    except ValueError:
+        flash('Invalid filter values.', 'error')
+        return redirect(url_for('inventory'))
+    if request.args.get('format') == 'csv':
+        # Full dump streamed in chunks so memory stays flat however many fittings match
+        return Response(stream_with_context(inventory_csv(query)), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=inventory.csv'})
+
+    fittings = query.filter(Fitting.id > after).limit(limit + 1).all()
+    has_next = len(fittings) > limit
+    fittings = fittings[:limit]
+    filters = {name: request.args.get(name, '') for name in ('fitting_type', 'vendor_lot', 'supplied_from', 'supplied_to', 'overdue')}
+    filter_args = '&'.join(f'{name}={quote(value)}' for name, value in filters.items() if value)
+    type_options = ''.join(
+        f'<option value="{t}"{" selected" if filters["fitting_type"] == t else ""}>{t}</option>'
+        for t in FITTING_TYPES
+    )
+    content = f'''
+    <h2>Fittings Inventory</h2>
+    <form method="get">
+        <label>Fitting Type:</label>
+        <select name="fitting_type"><option value="">All</option>{type_options}</select>
+        <label>Vendor Lot Number:</label>
+        <input type="text" name="vendor_lot" value="{escape(filters['vendor_lot'])}">
+        <label>Supplied From:</label>
+        <input type="date" name="supplied_from" value="{escape(filters['supplied_from'])}">
+        <label>Supplied To:</label>
+        <input type="date" name="supplied_to" value="{escape(filters['supplied_to'])}">
+        <label><input type="checkbox" name="overdue" value="1" style="width:auto"{" checked" if filters['overdue'] else ""}> Overdue for inspection only</label>
+        <button type="submit">Filter</button>
+    </form>
+    <p><a href="/inventory?format=csv&{filter_args}">Download full inventory (CSV)</a> |
+       <a href="/inventory/pdf?{filter_args}">PDF</a> |
+       <a href="/inventory/pdf?background=1&{filter_args}">PDF (background job)</a></p>
+    '''
     if fittings:
         content += '''
         <table>
         <tr><th>ID</th><th>Type</th><th>Vendor Lot</th><th>Supply Date</th><th>Warranty (months)</th><th>Inspections</th></tr>
         '''
+        page_inspections = inspections_for([f.id for f in fittings])
         for f in fittings:
-            inspections = json.loads(f.inspection_dates) if f.inspection_dates else []
+            inspections = page_inspections.get(f.id, [])
             content += f'''
             <tr>
                 <td>{f.id}</td>
-                <td>{f.fitting_type}</td>
-                <td>{f.vendor_lot}</td>
+                <td>{escape(f.fitting_type)}</td>
+                <td>{escape(f.vendor_lot)}</td>
                 <td>{f.supply_date}</td>
                 <td>{f.warranty_period}</td>
-                <td>{', '.join(inspections) if inspections else 'None'}</td>
+                <td>{escape(', '.join(inspections)) if inspections else 'None'}</td>
             </tr>
             '''
         content += '</table>'
+        links = []
+        if after:
+            links.append(f'<a href="/inventory?{filter_args}">First page</a>')
+        if has_next:
+            links.append(f'<a href="/inventory?after={fittings[-1].id}&limit={limit}&{filter_args}">Next page</a>')
+        content += f'<p>{" | ".join(links)}</p>'
     else:
         content += '<p>No fittings in inventory.</p>'
     return render_template_string(HTML_TEMPLATE, content=content)
 
+REPORT_TOP_LOTS = 20
+
+QR_BATCH_LIMIT = 100000
+
+def parse_id_list(text):
+    # "1-100, 205, 300-310" -> filter on Fitting.id; raises ValueError
+    conditions = []
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            low, high = (int(v) for v in part.split('-', 1))
+            conditions.append(Fitting.id.between(min(low, high), max(low, high)))
+        else:
+            conditions.append(Fitting.id == int(part))
+    if not conditions:
+        raise ValueError('no fitting IDs given')
+    return db.or_(*conditions)
+
+def rendered_fittings(query):
+    # (fitting, png) pairs, one page of fittings at a time through the render pool
+    for rows in inventory_pages(query):
+        payloads = [qr_payload.encode(r.id) for r in rows]
+        for row, png in zip(rows, qr_render.render_many(payloads, qr_cache.directory)):
+            yield row, png
+
+def qr_zip(query):
+    buffer = qr_render.StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for row, png in rendered_fittings(query):
+            archive.writestr(f'qr_{row.id}.png', png)
+            yield buffer.drain()
+    yield buffer.drain()
+
+def qr_label_pdf(query):
+    pdf = tempfile.TemporaryFile()
+    sheet = qr_render.LabelSheet(pdf)
+    for row, png in rendered_fittings(query):
+        sheet.add(png, f'#{row.id} {row.fitting_type} {row.vendor_lot}')
+    sheet.save()
+    pdf.seek(0)
+    return pdf
+
+@app.route('/batch_qr', methods=['GET', 'POST'])
+@login_required
+def batch_qr():
+    if request.method == 'POST':
+        vendor_lot = request.form.get('vendor_lot', '').strip()
+        ids = request.form.get('fitting_ids', '').strip()
+        output = request.form.get('output', 'zip')
+        query = db.session.query(Fitting.id, Fitting.fitting_type, Fitting.vendor_lot).order_by(Fitting.id)
+        try:
+            if ids:
+                query = query.filter(parse_id_list(ids))
+            if vendor_lot:
+                query = query.filter(Fitting.vendor_lot == vendor_lot)
+            if not ids and not vendor_lot:
+                raise ValueError('give a vendor lot or fitting IDs')
+        except ValueError as e:
+            flash(f'Invalid selection: {e}', 'error')
+            return redirect(url_for('batch_qr'))
+        count = query.order_by(None).count()
+        if not count:
+            flash('No fittings match the selection.', 'error')
+            return redirect(url_for('batch_qr'))
+        if count > QR_BATCH_LIMIT:
+            flash(f'{count} fittings selected, the limit is {QR_BATCH_LIMIT} per request.', 'error')
+            return redirect(url_for('batch_qr'))
+        if output == 'pdf':
+            return send_file(qr_label_pdf(query), mimetype='application/pdf', as_attachment=True,
+                             download_name='qr_labels.pdf')
+        return Response(stream_with_context(qr_zip(query)), mimetype='application/zip',
+                        headers={'Content-Disposition': 'attachment; filename=qr_codes.zip'})
+
+    content = '''
+    <h2>Batch QR Codes</h2>
+    <form method="post">
+        <label>Vendor Lot Number:</label>
+        <input type="text" name="vendor_lot">
+        <label>Fitting IDs (e.g. 1-500, 812):</label>
+        <input type="text" name="fitting_ids">
+        <label>Output:</label>
+        <select name="output">
+            <option value="zip">ZIP of PNG images</option>
+            <option value="pdf">PDF label sheets</option>
+        </select>
+        <button type="submit">Generate</button>
+    </form>
+    '''
+    return render_template_string(HTML_TEMPLATE, content=content)
+
 @app.route('/reports')
 def reports():
-    fittings = Fitting.query.all()
-    total = len(fittings)
-    types_count = {}
-    expired_warranty = 0
-    now = datetime.now().date()
-    for f in fittings:
-        types_count[f.fitting_type] = types_count.get(f.fitting_type, 0) + 1
-        warranty_end = f.supply_date + timedelta(days=f.warranty_period * 30)
-        if now > warranty_end:
-            expired_warranty += 1
+    # Counts come from the materialized summary; expiry is a range count on
+    # the warranty_end index, so neither grows with a full table scan
+    total = db.session.query(db.func.coalesce(db.func.sum(FittingSummary.fittings), 0)).scalar()
+    inspections = db.session.query(db.func.coalesce(db.func.sum(FittingSummary.inspections), 0)).scalar()
+    types_count = (db.session.query(FittingSummary.fitting_type, db.func.sum(FittingSummary.fittings))
+                   .group_by(FittingSummary.fitting_type).order_by(FittingSummary.fitting_type).all())
+    lots_count = (db.session.query(FittingSummary.vendor_lot, db.func.sum(FittingSummary.fittings).label('fittings'))
+                  .group_by(FittingSummary.vendor_lot).order_by(db.desc('fittings')).limit(REPORT_TOP_LOTS).all())
+    months_count = (db.session.query(FittingSummary.supply_month, db.func.sum(FittingSummary.fittings))
+                    .group_by(FittingSummary.supply_month).order_by(FittingSummary.supply_month).all())
+    expired_warranty = Fitting.query.filter(Fitting.warranty_end < datetime.now().date()).count()
+    overdue_inspection = Fitting.query.filter(overdue_filter()).count()
 
     content = f'''
     <h2>AI-Based Reports</h2>
     <p><strong>Total Fittings:</strong> {total}</p>
+    <p><strong>Total Inspections:</strong> {inspections}</p>
     <p><strong>By Type:</strong></p>
     <ul>
     '''
-    for t, c in types_count.items():
-        content += f'<li>{t}: {c}</li>'
+    for t, c in types_count:
+        content += f'<li>{escape(t)}: {c}</li>'
     content += f'''
     </ul>
     <p><strong>Expired Warranty:</strong> {expired_warranty}</p>
+    <p><strong>Overdue for Inspection ({INSPECTION_INTERVAL_DAYS} days):</strong> <a href="/inventory?overdue=1">{overdue_inspection}</a></p>
+    <p><strong>By Vendor Lot (top {REPORT_TOP_LOTS}):</strong></p>
+    <ul>
+    '''
+    for lot, c in lots_count:
+        content += f'<li>{escape(lot)}: {c}</li>'
+    content += '''
+    </ul>
+    <p><strong>By Supply Month:</strong></p>
+    <ul>
+    '''
+    for month, c in months_count:
+        content += f'<li>{month}: {c}</li>'
+    content += '''
+    </ul>
     <p><em>Note: This is a simulated AI report with basic analytics.</em></p>
+    <p><a href="/reports/pdf">Export to PDF</a> | <a href="/reports/pdf?background=1">Export to PDF (background job)</a></p>
     '''
     return render_template_string(HTML_TEMPLATE, content=content)
 
+PDF_FETCH_SIZE = 2000
+PDF_ROWS_PER_PAGE = 45
+# reportlab keeps every page of a document in memory until save(), so long
+# exports are split into PDFs of PDF_PART_ROWS rows. Each part is sent (or
+# written into the export ZIP) as soon as it is complete, so memory holds at
+# most one part however many rows match.
+PDF_PART_ROWS = int(os.environ.get('PDF_PART_ROWS', 5000))
+PDF_SYNC_ROWS = int(os.environ.get('PDF_SYNC_ROWS', 50000))  # larger exports run as background jobs
+EXPORT_DIR = os.path.join(app.instance_path, 'exports')
+INVENTORY_PDF_COLUMNS = [('ID', 40), ('Type', 100), ('Vendor Lot', 110), ('Supply Date', 70),
+                         ('Warranty', 50), ('Warranty Ends', 75), ('Last Inspection', 75)]
+REPORT_PDF_COLUMNS = [('Vendor Lot', 150), ('Supply Month', 90), ('Type', 120), ('Fittings', 70), ('Inspections', 70)]
+
+class PdfTable:
+    # Paginated table on a reportlab canvas; rows are drawn as they arrive
+    def __init__(self, fileobj, title, columns):
+        self.canvas = canvas.Canvas(fileobj, pagesize=letter, pageCompression=1)
+        self.width, self.height = letter
+        self.title = title
+        self.columns = columns
+        self.page = 0
+        self.rows = 0
+        self.rows_on_page = PDF_ROWS_PER_PAGE
+
+    def line(self, text, size=10, gap=14):
+        self.canvas.setFont('Helvetica', size)
+        self.canvas.drawString(36, self.y, text)
+        self.y -= gap
+
+    def new_page(self):
+        if self.page:
+            self.canvas.showPage()
+        self.page += 1
+        self.y = self.height - 40
+        self.canvas.setFont('Helvetica-Bold', 12)
+        self.canvas.drawString(36, self.y, self.title)
+        self.canvas.setFont('Helvetica', 8)
+        self.canvas.drawRightString(self.width - 36, self.y, f'Page {self.page}')
+        self.y -= 24
+
+    def header(self):
+        self.canvas.setFont('Helvetica-Bold', 8)
+        x = 36
+        for name, width in self.columns:
+            self.canvas.drawString(x, self.y, name)
+            x += width
+        self.y -= 14
+        self.rows_on_page = 0
+
+    def add_row(self, values):
+        if self.rows_on_page >= PDF_ROWS_PER_PAGE or self.y < 40:
+            self.new_page()
+            self.header()
+        self.canvas.setFont('Helvetica', 8)
+        x = 36
+        for value, (_, width) in zip(values, self.columns):
+            self.canvas.drawString(x, self.y, '' if value is None else str(value)[:width // 4])
+            x += width
+        self.y -= 14
+        self.rows += 1
+        self.rows_on_page += 1
+
+    def save(self):
+        self.canvas.save()
+
+def pdf_parts(rows, start_table):
+    # (part number, PDF bytes, row count) for every PDF_PART_ROWS rows, each
+    # yielded as soon as its document is saved; start_table(fileobj, part)
+    # opens the table of a new part
+    part, buffer = 1, BytesIO()
+    table = start_table(buffer, part)
+    for values in rows:
+        if table.rows >= PDF_PART_ROWS:
+            table.save()
+            yield part, buffer.getvalue(), table.rows
+            part, buffer = part + 1, BytesIO()
+            table = start_table(buffer, part)
+        table.add_row(values)
+    table.save()
+    yield part, buffer.getvalue(), table.rows
+
+def part_title(title, part):
+    return title if part == 1 else f'{title} (part {part})'
+
+def inventory_pdf_parts(args):
+    # Rows come from a server-side cursor in PDF_FETCH_SIZE batches, so the
+    # result set is never materialized
+    query = inventory_query(args).add_columns(Fitting.warranty_end, Fitting.last_inspection)
+    title = f'Fittings Inventory - {datetime.now():%Y-%m-%d %H:%M}'
+    filters = ', '.join(f'{name}={value}' for name, value in args.items() if value and name != 'format')
+    def start_table(fileobj, part):
+        table = PdfTable(fileobj, part_title(title, part), INVENTORY_PDF_COLUMNS)
+        table.new_page()
+        table.line(f'Filters: {filters or "none"}', size=9)
+        table.header()
+        return table
+    rows = ([f.id, f.fitting_type, f.vendor_lot, f.supply_date, f.warranty_period, f.warranty_end, f.last_inspection]
+            for f in query.execution_options(stream_results=True).yield_per(PDF_FETCH_SIZE))
+    return pdf_parts(rows, start_table)
+
+def reports_pdf_parts():
+    title = f'Fittings Report - {datetime.now():%Y-%m-%d %H:%M}'
+    def start_table(fileobj, part):
+        table = PdfTable(fileobj, part_title(title, part), REPORT_PDF_COLUMNS)
+        table.new_page()
+        if part == 1:
+            write_report_totals(table)
+            table.y -= 10
+        table.header()
+        return table
+    summary = (db.session.query(FittingSummary)
+               .order_by(FittingSummary.vendor_lot, FittingSummary.supply_month, FittingSummary.fitting_type)
+               .execution_options(stream_results=True).yield_per(PDF_FETCH_SIZE))
+    rows = ([r.vendor_lot, r.supply_month, r.fitting_type, r.fittings, r.inspections] for r in summary)
+    return pdf_parts(rows, start_table)
+
+def write_report_totals(table):
+    today = datetime.now().date()
+    total = db.session.query(db.func.coalesce(db.func.sum(FittingSummary.fittings), 0)).scalar()
+    inspections = db.session.query(db.func.coalesce(db.func.sum(FittingSummary.inspections), 0)).scalar()
+    table.line(f'Total fittings: {total}')
+    table.line(f'Total inspections: {inspections}')
+    table.line(f'Expired warranty: {Fitting.query.filter(Fitting.warranty_end < today).count()}')
+    table.line(f'Overdue for inspection ({INSPECTION_INTERVAL_DAYS} days): {Fitting.query.filter(overdue_filter(today)).count()}')
+    for fitting_type, count in (db.session.query(FittingSummary.fitting_type, db.func.sum(FittingSummary.fittings))
+                                .group_by(FittingSummary.fitting_type).order_by(FittingSummary.fitting_type)):
+        table.line(f'{fitting_type}: {count}', size=9, gap=12)
+
+def export_parts(kind, args=None):
+    return inventory_pdf_parts(args or {}) if kind == 'inventory' else reports_pdf_parts()
+
+def single_part(parts):
+    # (part, None) when the export fits in one PDF, else (None, parts) with
+    # the first two parts put back in front of the rest
+    first = next(parts)
+    second = next(parts, None)
+    if second is None:
+        return first, None
+    return None, itertools.chain([first, second], parts)
+
+def part_name(kind, part):
+    return f'{kind}_part{part:03d}.pdf'
+
+def pdf_zip(kind, parts):
+    # PDF pages are compressed already, so parts are stored as they are
+    buffer = qr_render.StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for part, pdf, _ in parts:
+            archive.writestr(part_name(kind, part), pdf)
+            yield buffer.drain()
+    yield buffer.drain()
+
+_export_executor = None
+
+def get_export_executor():
+    global _export_executor
+    if _export_executor is None:
+        _export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+    return _export_executor
+
+def export_path(job_id, extension):
+    return os.path.join(EXPORT_DIR, f'export_{job_id}.{extension}')
+
+def export_file(job_id):
+    # Path of a finished export: one PDF, or a ZIP of part PDFs
+    return next((path for path in (export_path(job_id, 'pdf'), export_path(job_id, 'zip')) if os.path.exists(path)), None)
+
+def run_export(job_id):
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        job.status = 'running'
+        db.session.commit()
+        try:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            pdf, parts = single_part(export_parts(job.kind, json.loads(job.args or '{}')))
+            extension = 'pdf' if pdf else 'zip'
+            partial_path = export_path(job_id, extension) + '.part'
+            if pdf:
+                with open(partial_path, 'wb') as f:
+                    f.write(pdf[1])
+                rows = pdf[2]
+            else:
+                rows = 0
+                with zipfile.ZipFile(partial_path, 'w', zipfile.ZIP_STORED) as archive:
+                    for part, data, count in parts:
+                        archive.writestr(part_name(job.kind, part), data)
+                        rows += count
+            os.replace(partial_path, export_path(job_id, extension))
+            job.status, job.rows, job.message = 'done', rows, f'{rows} rows exported.'
+        except Exception as e:
+            db.session.rollback()
+            job.status, job.message = 'failed', str(e)
+            app.logger.exception('Export %s failed', job_id)
+        job.finished_at = datetime.now()
+        db.session.commit()
+
+def start_export(kind, args=None):
+    job = ExportJob(kind=kind, args=json.dumps(args or {}), created_by=current_user.id, worker=EXPORT_WORKER)
+    db.session.add(job)
+    db.session.commit()
+    get_export_executor().submit(run_export, job.id)
+    flash('The export is running in the background.', 'success')
+    return redirect(url_for('export_status', job_id=job.id))
+
+def send_export(kind, args, download_name):
+    # One part goes out as a plain PDF; more stream as a ZIP, part by part
+    pdf, parts = single_part(export_parts(kind, args))
+    if pdf:
+        return send_file(BytesIO(pdf[1]), mimetype='application/pdf', as_attachment=True,
+                         download_name=f'{download_name}.pdf')
+    return Response(stream_with_context(pdf_zip(kind, parts)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={download_name}.zip'})
+
+@app.route('/inventory/pdf')
+@login_required
+def inventory_pdf():
+    args = {name: value for name, value in request.args.items() if name in ('fitting_type', 'vendor_lot', 'supplied_from', 'supplied_to', 'overdue')}
+    try:
+        count = inventory_query(args).order_by(None).count()
+    except ValueError:
+        flash('Invalid filter values.', 'error')
+        return redirect(url_for('inventory'))
+    if request.args.get('background') or count > PDF_SYNC_ROWS:
+        return start_export('inventory', args)
+    return send_export('inventory', args, 'inventory')
+
+@app.route('/reports/pdf')
+@login_required
+def reports_pdf():
+    if request.args.get('background'):
+        return start_export('reports')
+    return send_export('reports', None, 'report')
+
+@app.route('/exports/<int:job_id>')
+@login_required
+def export_status(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job or (job.created_by != current_user.id and current_user.role != 'admin'):
+        flash('Export not found.', 'error')
+        return redirect(url_for('home'))
+    if job.status in ('queued', 'running') and export_orphaned(job):
+        fail_export(job)
+        db.session.commit()
+    content = f'<h2>Export #{job.id} ({job.kind})</h2><p><strong>Status:</strong> {job.status}</p>'
+    if job.message:
+        content += f'<p>{escape(job.message)}</p>'
+    if job.status == 'done':
+        content += f'<p><a href="/exports/{job.id}/download">Download</a></p>'
+    elif job.status in ('queued', 'running'):
+        content = '<meta http-equiv="refresh" content="3">' + content
+    return render_template_string(HTML_TEMPLATE, content=content)
+
+@app.route('/exports/<int:job_id>/download')
+@login_required
+def export_download(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job or job.status != 'done' or (job.created_by != current_user.id and current_user.role != 'admin'):
+        return 'Export not found', 404
+    path = export_file(job_id)
+    if path is None:
+        return 'Export not found', 404
+    extension = os.path.splitext(path)[1]
+    return send_file(path, mimetype='application/pdf' if extension == '.pdf' else 'application/zip', as_attachment=True,
+                     download_name=f'{job.kind}_{job.created_at:%Y%m%d}{extension}')
+
+ALERT_WARRANTY_DAYS = int(os.environ.get('ALERT_WARRANTY_DAYS', 30))
+ALERT_REFRESH_SECONDS = int(os.environ.get('ALERT_REFRESH_SECONDS', 15 * 60))  # 0 disables the scheduler
+ALERT_PAGE_SIZE = 50
+ALERT_KINDS = {'warranty': 'Warranty ending', 'inspection': 'Inspection overdue'}
+
+def refresh_alerts(today=None, max_age=None):
+    # Rebuilds the alert table from two index range scans (warranty_end and
+    # overdue_filter) with INSERT .. SELECT, in one transaction so readers
+    # see either the old or the new set. Refreshes are serialized across
+    # processes; with max_age, one is skipped if another process finished
+    # a refresh within that many seconds. Returns whether it ran.
+    today = today or datetime.now().date()
+    db_config.lock_for_update(db.session, 'refresh_alerts')
+    # Pruning old runs first is the transaction's first write, which takes
+    # SQLite's write lock before the freshness check below
+    db.session.query(AlertRun).filter(AlertRun.refreshed_at < datetime.now() - timedelta(days=7)).delete()
+    if max_age:
+        latest = db.session.query(db.func.max(AlertRun.refreshed_at)).scalar()
+        if latest and latest > datetime.now() - timedelta(seconds=max_age):
+            db.session.rollback()
+            return False
+    alerts = Alert.__table__
+    columns = ['kind', 'fitting_id', 'fitting_type', 'vendor_lot', 'reference_date']
+    warranty = (db.select(db.literal('warranty'), Fitting.id, Fitting.fitting_type, Fitting.vendor_lot, Fitting.warranty_end)
+                .where(Fitting.warranty_end.between(today, today + timedelta(days=ALERT_WARRANTY_DAYS)))
+                .order_by(Fitting.warranty_end, Fitting.id))
+    last_seen = db.func.coalesce(Fitting.last_inspection, Fitting.supply_date)
+    inspection = (db.select(db.literal('inspection'), Fitting.id, Fitting.fitting_type, Fitting.vendor_lot, last_seen)
+                  .where(overdue_filter(today)).order_by(last_seen, Fitting.id))
+    db.session.execute(alerts.delete())
+    warranty_count = db.session.execute(alerts.insert().from_select(columns, warranty)).rowcount
+    inspection_count = db.session.execute(alerts.insert().from_select(columns, inspection)).rowcount
+    db.session.add(AlertRun(refreshed_at=datetime.now(), warranty_days=ALERT_WARRANTY_DAYS,
+                            warranty_alerts=warranty_count, inspection_alerts=inspection_count))
+    db.session.commit()
+    return True
+
+_alert_scheduler = None
+_alert_scheduler_lock = threading.Lock()
+
+def alert_scheduler_loop():
+    while True:
+        try:
+            # Every serving process runs this loop; only the first one due refreshes
+            with app.app_context():
+                refresh_alerts(max_age=ALERT_REFRESH_SECONDS)
+        except Exception:
+            app.logger.exception('Alert refresh failed')
+        time.sleep(ALERT_REFRESH_SECONDS)
+
+@app.before_request
+def start_alert_scheduler():
+    # Started by the first request so only serving processes run it
+    global _alert_scheduler
+    if _alert_scheduler is not None or not ALERT_REFRESH_SECONDS:
+        return
+    with _alert_scheduler_lock:
+        if _alert_scheduler is None:
+            _alert_scheduler = threading.Thread(target=alert_scheduler_loop, name='alert-refresh', daemon=True)
+            _alert_scheduler.start()
+
+@app.route('/alerts')
+@login_required
+def alerts():
+    kind = request.args.get('kind', 'warranty')
+    if kind not in ALERT_KINDS:
+        kind = 'warranty'
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        after = 0
+    run = AlertRun.query.order_by(AlertRun.id.desc()).first()
+    rows = (Alert.query.filter(Alert.kind == kind, Alert.id > after)
+            .order_by(Alert.id).limit(ALERT_PAGE_SIZE + 1).all())
+    has_next = len(rows) > ALERT_PAGE_SIZE
+    rows = rows[:ALERT_PAGE_SIZE]
+    content = '<h2>Alerts Dashboard</h2>'
+    if run:
+        content += (f'<p>Last refreshed {run.refreshed_at:%Y-%m-%d %H:%M}: '
+                    f'<a href="/alerts?kind=warranty">{run.warranty_alerts} warranties ending within {run.warranty_days} days</a>, '
+                    f'<a href="/alerts?kind=inspection">{run.inspection_alerts} fittings overdue for inspection '
+                    f'({INSPECTION_INTERVAL_DAYS} days)</a>.</p>')
+    else:
+        content += '<p>Alerts have not been computed yet.</p>'
+    if current_user.role == 'admin':
+        content += '<form method="post" action="/alerts/refresh"><button type="submit">Refresh now</button></form>'
+    date_label = 'Warranty Ends' if kind == 'warranty' else 'Last Inspected / Supplied'
+    content += f'<h3>{ALERT_KINDS[kind]}</h3>'
+    if rows:
+        content += f'<table><tr><th>Fitting ID</th><th>Type</th><th>Vendor Lot</th><th>{date_label}</th></tr>'
+        for alert in rows:
+            content += (f'<tr><td><a href="/api/scan?qr={qr_payload.encode(alert.fitting_id)}">{alert.fitting_id}</a></td>'
+                        f'<td>{escape(alert.fitting_type)}</td><td>{escape(alert.vendor_lot)}</td><td>{alert.reference_date}</td></tr>')
+        content += '</table>'
+        links = []
+        if after:
+            links.append(f'<a href="/alerts?kind={kind}">First page</a>')
+        if has_next:
+            links.append(f'<a href="/alerts?kind={kind}&after={rows[-1].id}">Next page</a>')
+        content += f'<p>{" | ".join(links)}</p>'
+    else:
+        content += '<p>No alerts.</p>'
+    return render_template_string(HTML_TEMPLATE, content=content)
+
+@app.route('/alerts/refresh', methods=['POST'])
+@login_required
+def refresh_alerts_now():
+    if current_user.role != 'admin':
+        flash('Only admins can refresh alerts.', 'error')
+        return redirect(url_for('alerts'))
+    refresh_alerts()
+    flash('Alerts refreshed.', 'success')
+    return redirect(url_for('alerts'))
+
+@app.cli.command('refresh-alerts')
+def refresh_alerts_command():
+    """Recompute the alert table."""
+    refresh_alerts()
+    run = AlertRun.query.order_by(AlertRun.id.desc()).first()
+    click.echo(f'{run.warranty_alerts} warranty alerts, {run.inspection_alerts} inspection alerts.')
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,205 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import excel_ingest
+from workbook_index import (EXCLUDED_COLUMNS, TrigramIndex, WorkbookIndex, canonical_name, normalize_name,
+                            sheet_sectors, trigrams)
+
+# (rows, company columns)
+SIZES = [
+    (1_000, 5),
+    (10_000, 10),
+    (50_000, 20),
+    (200_000, 30),
+]
+LEGACY_CELL_LIMIT = 1_000_000
+SECTORS = ['Agriculture', 'Energy', 'Finance', 'Health', 'Mining', 'Retail', 'Transport', '']
+QUERIES = ['Acme Ltd', 'globex', 'Initech', 'missing company']
+# Workbook for the ingestion benchmark: sheets of (rows, company columns)
+INGEST_SHEETS = 4
+INGEST_SIZE = (10_000, 20)
+# Distinct names for the fuzzy benchmark
+FUZZY_NAMES = [1_000, 10_000, 100_000]
+FUZZY_THRESHOLDS = [0.6, 0.8, 1.0]
+
+
+def generate_sheet(num_rows, num_columns, seed=0):
+    # Company cells as read with dtype=str and fillna(''): mixed case, stray
+    # whitespace and empty cells
+    rng = random.Random(seed)
+    names = ['Acme Ltd', 'Globex', 'Initech', 'Umbrella', 'Hooli'] + [f'Company {i}' for i in range(500)]
+    def cell():
+        name = rng.choice(names) if rng.random() < 0.8 else ''
+        if rng.random() < 0.2:
+            name = name.upper()
+        if rng.random() < 0.2:
+            name = f' {name}  '
+        return name
+    data = {
+        'District': [f'District {rng.randint(1, 40)}' for _ in range(num_rows)],
+        'Sector': [rng.choice(SECTORS) for _ in range(num_rows)],
+    }
+    for i in range(num_columns):
+        data[f'Company {i + 1}'] = [cell() for _ in range(num_rows)]
+    return pd.DataFrame(data)
+
+
+def normalize_companies(df):
+    # Company cells stripped and lowercased once per sheet, as a 2-D object array
+    company_columns = [col for col in df.columns if col not in EXCLUDED_COLUMNS]
+    if not company_columns:
+        return np.empty((len(df), 0), dtype=object)
+    return np.column_stack([df[col].astype(str).str.strip().str.lower().to_numpy(dtype=object)
+                            for col in company_columns])
+
+
+def match_sheet(companies, sectors, company_name):
+    # Vectorized full scan, the reference the index is checked against: a row
+    # counts once if any of its company cells equals the name
+    found = (companies == normalize_name(company_name)).any(axis=1)
+    matched = pd.Series(sectors[found])
+    return int(found.sum()), matched.groupby(matched).size().to_dict()
+
+
+def legacy_count(df, company_name):
+    # Port of the original iterrows loop in company_sector_counter.index
+    total_count = 0
+    sector_counts = {}
+    for idx, row in df.iterrows():
+        sector = row.get('Sector', '')
+        company_columns = [col for col in df.columns if col not in ['District', 'Sector']]
+        found_in_row = any(company_name.lower() == str(row[col]).strip().lower() for col in company_columns)
+        if found_in_row:
+            total_count += 1
+            sector_counts[sector] = sector_counts.get(sector, 0) + 1
+    return total_count, sector_counts
+
+
+def run(sizes):
+    print(f'{"size":<14}{"method":<12}{"prepare s":>10}{"query s":>10}  matches')
+    for num_rows, num_columns in sizes:
+        df = generate_sheet(num_rows, num_columns)
+        label = f'{num_rows}x{num_columns}'
+
+        start = time.perf_counter()
+        companies, sectors = normalize_companies(df), sheet_sectors(df)
+        prepare = time.perf_counter() - start
+        start = time.perf_counter()
+        results = [match_sheet(companies, sectors, query) for query in QUERIES]
+        query = (time.perf_counter() - start) / len(QUERIES)
+        print(f'{label:<14}{"vectorized":<12}{prepare:>10.3f}{query:>10.3f}  {[r[0] for r in results]}')
+
+        start = time.perf_counter()
+        index = WorkbookIndex(label, [('Sheet1', df)])
+        prepare = time.perf_counter() - start
+        start = time.perf_counter()
+        indexed = [index.count(query) for query in QUERIES]
+        query = (time.perf_counter() - start) / len(QUERIES)
+        print(f'{label:<14}{"index":<12}{prepare:>10.3f}{query:>10.6f}  {[r[0] for r in indexed]}')
+        assert indexed == results, f'{label}: index counts differ from the vectorized scan'
+
+        if num_rows * num_columns > LEGACY_CELL_LIMIT:
+            print(f'{label:<14}{"legacy":<12}{"-":>10}{"-":>10}  skipped (too large)')
+            continue
+        start = time.perf_counter()
+        legacy = [legacy_count(df, query) for query in QUERIES]
+        query = (time.perf_counter() - start) / len(QUERIES)
+        print(f'{label:<14}{"legacy":<12}{"-":>10}{query:>10.3f}  {[r[0] for r in legacy]}')
+        assert results == legacy, f'{label}: vectorized counts differ from the row loop'
+
+    # A sheet without a Sector column counts every match under ''
+    df = generate_sheet(2_000, 4, seed=1).drop(columns=['Sector'])
+    assert match_sheet(normalize_companies(df), sheet_sectors(df), 'Acme Ltd') == legacy_count(df, 'Acme Ltd')
+    assert WorkbookIndex('', [('Sheet1', df)]).count('Acme Ltd') == legacy_count(df, 'Acme Ltd')
+
+
+def run_ingest(num_sheets):
+    # Parses one workbook with pandas (the previous read path) and with each
+    # excel_ingest engine available, then loads it back from the columnar cache
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        for i in range(num_sheets):
+            generate_sheet(*INGEST_SIZE, seed=i).to_excel(writer, sheet_name=f'Sheet{i + 1}', index=False)
+    data = buffer.getvalue()
+    label = f'{num_sheets}x{INGEST_SIZE[0]}x{INGEST_SIZE[1]}'
+    print(f'{"workbook":<18}{"reader":<22}{"seconds":>10}')
+
+    start = time.perf_counter()
+    xls = pd.ExcelFile(BytesIO(data))
+    expected = [(name, pd.read_excel(xls, sheet_name=name, dtype=str).fillna('').drop(columns=['District']))
+                for name in xls.sheet_names]
+    print(f'{label:<18}{"pandas, sequential":<22}{time.perf_counter() - start:>10.2f}')
+
+    engines = ['openpyxl'] + (['calamine'] if excel_ingest.python_calamine else [])
+    for engine in engines:
+        start = time.perf_counter()
+        sheets = excel_ingest.read_workbook(data, skip_columns=['District'], engine=engine)
+        print(f'{label:<18}{engine + f", {excel_ingest.MAX_WORKERS} workers":<22}{time.perf_counter() - start:>10.2f}')
+        for (name, df), (expected_name, expected_df) in zip(sheets, expected):
+            assert name == expected_name and list(df.columns) == list(expected_df.columns)
+            assert (df.to_numpy() == expected_df.to_numpy(dtype=object)).all(), f'{engine}: {name} differs'
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = excel_ingest.ColumnarCache(os.path.join(directory, 'sheets'))
+        excel_ingest.read_workbook(data, skip_columns=['District'], cache=cache)
+        start = time.perf_counter()
+        excel_ingest.read_workbook(data, skip_columns=['District'], cache=cache)
+        print(f'{label:<18}{excel_ingest.COLUMNAR_FORMAT + " cache":<22}{time.perf_counter() - start:>10.2f}')
+
+
+def generate_names(count, seed=0):
+    rng = random.Random(seed)
+    words = ['tata', 'motors', 'steel', 'global', 'india', 'power', 'infra', 'tech', 'systems', 'foods',
+             'agro', 'textiles', 'pharma', 'energy', 'capital', 'finance', 'logistics', 'chemicals']
+    suffixes = ['Ltd', 'Limited', 'Pvt. Ltd.', 'Inc', 'Corp', '& Co', '']
+    names = set()
+    while len(names) < count:
+        tag = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 8)))
+        prefix = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        names.add(f'{prefix} {tag} {rng.choice(suffixes)}'.strip().lower())
+    return sorted(names)
+
+
+def run_fuzzy(sizes):
+    # Trigram search against scoring every distinct name
+    print(f'{"names":<10}{"threshold":>10}{"build s":>10}{"index ms":>10}{"scan ms":>10}')
+    for count in sizes:
+        names = generate_names(count)
+        start = time.perf_counter()
+        index = TrigramIndex(names)
+        build = time.perf_counter() - start
+        grams = [trigrams(canonical_name(name)) for name in names]
+        queries = random.Random(1).sample(names, 20) + ['Tata Motors Limited', 'unknown name']
+        for threshold in FUZZY_THRESHOLDS:
+            indexed = scanned = 0
+            for query in queries:
+                start = time.perf_counter()
+                found = sorted(name for name, _ in index.search(query, threshold))
+                indexed += time.perf_counter() - start
+                start = time.perf_counter()
+                query_grams = trigrams(canonical_name(query))
+                expected = sorted(name for name, name_grams in zip(names, grams)
+                                  if 2 * len(query_grams & name_grams) / (len(query_grams) + len(name_grams)) >= threshold)
+                scanned += time.perf_counter() - start
+                assert found == expected, f'{count} names, {query!r} at {threshold}: index misses matches'
+            print(f'{count:<10}{threshold:>10}{build:>10.2f}{indexed / len(queries) * 1000:>10.2f}'
+                  f'{scanned / len(queries) * 1000:>10.2f}')
+
+
+if __name__ == '__main__':
+    # company_sector_benchmark.py [sizes], ... ingest [sheets] or ... fuzzy [sizes]
+    if len(sys.argv) > 1 and sys.argv[1] == 'ingest':
+        run_ingest(int(sys.argv[2]) if len(sys.argv) > 2 else INGEST_SHEETS)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'fuzzy':
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else len(FUZZY_NAMES)
+        run_fuzzy(FUZZY_NAMES[:count])
+    else:
+        count = int(sys.argv[1]) if len(sys.argv) > 1 else len(SIZES)
+        run(SIZES[:count])
@@ -1,5 +1,11 @@
-from flask import Flask, request, render_template_string
-import pandas as pd
+import os
+from io import BytesIO
+
+from flask import Flask, request, render_template_string, send_file, jsonify
+from markupsafe import escape
+
+from excel_ingest import ColumnarCache
+from workbook_index import FUZZY_THRESHOLD, WorkbookCache
 
 app = Flask(__name__)
 
@@ -52,7 +58,7 @@ HTML_TEMPLATE = '''
             color: #00d4ff;
             font-weight: bold;
         }
-        input[type="file"], input[type="text"] {
+        input[type="file"], input[type="text"], textarea {
             width: 100%;
             padding: 10px;
             margin-top: 5px;
@@ -118,59 +124,176 @@ HTML_TEMPLATE = '''
 <body>
     <h1>Company Sector Counter</h1>
     <p>Upload the Excel file and enter a company name to get details about the sectors they work in and counts.</p>
+    {% if workbook %}
+    <form method="post">
+        <p>Searching {{ workbook.name or 'uploaded workbook' }}: {{ workbook.sheet_names|length }} sheets,
+           {{ workbook.row_count }} rows. <a href="/">Upload another file</a></p>
+        <input type="hidden" name="workbook" value="{{ workbook_key }}" />
+        <label for="company_name">Enter company name:</label>
+        <input type="text" name="company_name" />
+        <label for="companies">Or paste several company names, one per line:</label>
+        <textarea name="companies" rows="6"></textarea>
+        <label><input type="checkbox" name="fuzzy" value="1" {% if fuzzy %}checked{% endif %} />
+            Also count similar spellings (Ltd / Limited, punctuation, small typos)</label>
+        <label for="threshold">Similarity threshold, 0 to 1:</label>
+        <input type="text" name="threshold" value="{{ threshold }}" />
+        <button type="submit">Search</button>
+    </form>
+    {% else %}
     <form method="post" enctype="multipart/form-data">
         <label for="file">Upload Excel file (.xlsx):</label>
         <input type="file" name="file" accept=".xlsx" required />
-        <label for="company_name">Enter company name:</label>
-        <input type="text" name="company_name" required />
-        <button type="submit">Search</button>
+        <label for="company_name">Enter company name (optional, the file stays loaded for later searches):</label>
+        <input type="text" name="company_name" />
+        <label><input type="checkbox" name="fuzzy" value="1" {% if fuzzy %}checked{% endif %} />
+            Also count similar spellings (Ltd / Limited, punctuation, small typos)</label>
+        <label for="threshold">Similarity threshold, 0 to 1:</label>
+        <input type="text" name="threshold" value="{{ threshold }}" />
+        <button type="submit">Upload</button>
     </form>
+    {% endif %}
     {{ content|safe }}
 </body>
 </html>
 '''
 
+workbook_cache = WorkbookCache(os.path.join(app.instance_path, 'workbooks'),
+                               sheets=ColumnarCache(os.path.join(app.instance_path, 'workbook_sheets')))
+
+def fuzzy_threshold(values):
+    # None for exact matching, else the similarity threshold for fuzzy matching
+    if not values.get('fuzzy'):
+        return None
+    try:
+        threshold = float(values.get('threshold') or FUZZY_THRESHOLD)
+    except (TypeError, ValueError):
+        threshold = 0
+    if not 0 < threshold <= 1:
+        raise ValueError('The similarity threshold must be a number between 0 and 1.')
+    return threshold
+
+def matrix_table(matrix, workbook_key, companies, threshold):
+    content = f'<div class="result"><h2>Results for {len(matrix)} companies</h2>'
+    content += '<form method="post" action="/api/counts">'
+    content += f'<input type="hidden" name="workbook" value="{workbook_key}" />'
+    if threshold is not None:
+        content += f'<input type="hidden" name="fuzzy" value="1" /><input type="hidden" name="threshold" value="{threshold}" />'
+    content += f'<textarea name="companies" hidden>{escape(chr(10).join(companies))}</textarea>'
+    content += '<button type="submit" name="format" value="csv">Download CSV</button>'
+    content += '<button type="submit" name="format" value="xlsx">Download Excel</button></form>'
+    content += '<table><tr><th>Company</th>' + ''.join(f'<th>{escape(column)}</th>' for column in matrix.columns) + '</tr>'
+    for company, counts in zip(matrix.index, matrix.to_numpy()):
+        content += f'<tr><td>{escape(company)}</td>' + ''.join(f'<td>{count}</td>' for count in counts) + '</tr>'
+    return content + '</table></div>'
+
+def send_matrix(matrix, file_format):
+    buffer = BytesIO()
+    if file_format == 'csv':
+        buffer.write(matrix.to_csv().encode('utf-8'))
+        mimetype, download_name = 'text/csv', 'company_sectors.csv'
+    else:
+        matrix.to_excel(buffer, sheet_name='Company sectors')
+        mimetype, download_name = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'company_sectors.xlsx'
+    buffer.seek(0)
+    return send_file(buffer, mimetype=mimetype, as_attachment=True, download_name=download_name)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     content = ''
+    # The workbook is parsed and indexed once on upload; later searches only
+    # send its content hash
+    workbook_key = request.values.get('workbook', '')
+    workbook = workbook_cache.get(workbook_key)
     if request.method == 'POST':
         file = request.files.get('file')
         company_name = request.form.get('company_name', '').strip()
-        if not file or not company_name:
-            content = '<div class="result"><p style="color:red;">Please upload a file and enter a company name.</p></div>'
-        else:
+        companies = [name.strip() for name in request.form.get('companies', '').splitlines() if name.strip()]
+        error = ''
+        try:
+            threshold = fuzzy_threshold(request.form)
+        except ValueError as e:
+            threshold, error = None, str(e)
+        if file and not error:
             try:
-                xls = pd.ExcelFile(file)
-                total_count = 0
-                sector_counts = {}
-                sectors_found = set()
-                for sheet_name in xls.sheet_names:
-                    df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str)
-                    df.fillna('', inplace=True)
-                    # Iterate rows
-                    for idx, row in df.iterrows():
-                        sector = row.get('Sector', '')
-                        # Check all columns except District and Sector for company name
-                        company_columns = [col for col in df.columns if col not in ['District', 'Sector']]
-                        found_in_row = any(company_name.lower() == str(row[col]).strip().lower() for col in company_columns)
-                        if found_in_row:
-                            total_count += 1
-                            sector_counts[sector] = sector_counts.get(sector, 0) + 1
-                            sectors_found.add(sector)
-                if total_count > 0:
-                    content = f'<div class="result"><h2>Results for "{company_name}"</h2>'
-                    content += f'<p><strong>Total occurrences:</strong> {total_count}</p>'
-                    content += f'<p><strong>Sectors found:</strong> {", ".join(sorted(sectors_found))}</p>'
-                    content += '<h3>Occurrences per Sector:</h3>'
-                    content += '<table><tr><th>Sector</th><th>Count</th></tr>'
-                    for sector, count in sorted(sector_counts.items()):
-                        content += f'<tr><td>{sector}</td><td>{count}</td></tr>'
-                    content += '</table></div>'
-                else:
-                    content = f'<div class="result"><p>No occurrences of "{company_name}" found in the uploaded file.</p></div>'
+                workbook_key, workbook = workbook_cache.load(file.read(), file.filename)
             except Exception as e:
-                content = f'<div class="result"><p style="color:red;">Error processing file: {str(e)}</p></div>'
-    return render_template_string(HTML_TEMPLATE, content=content)
+                workbook = None
+                error = f'Error processing file: {str(e)}'
+        elif workbook is None and not error:
+            error = 'The uploaded file has expired, please upload it again.' if workbook_key else 'Please upload a file and enter a company name.'
+        if error:
+            content = f'<div class="result"><p style="color:red;">{error}</p></div>'
+        elif companies:
+            content = matrix_table(workbook.count_matrix(companies, threshold), workbook_key, companies, threshold)
+        elif company_name:
+            total_count, sector_counts = workbook.count(company_name, threshold)
+            sectors_found = set(sector_counts)
+            if total_count > 0:
+                content = f'<div class="result"><h2>Results for "{company_name}"</h2>'
+                if threshold is not None:
+                    matched = workbook.similar_names(company_name, threshold)
+                    content += f'<p><strong>Matched names:</strong> {escape(", ".join(f"{name} ({score:.2f})" for name, score in matched))}</p>'
+                content += f'<p><strong>Total occurrences:</strong> {total_count}</p>'
+                content += f'<p><strong>Sectors found:</strong> {", ".join(sorted(sectors_found))}</p>'
+                content += '<h3>Occurrences per Sector:</h3>'
+                content += '<table><tr><th>Sector</th><th>Count</th></tr>'
+                for sector, count in sorted(sector_counts.items()):
+                    content += f'<tr><td>{sector}</td><td>{count}</td></tr>'
+                content += '</table></div>'
+            else:
+                content = f'<div class="result"><p>No occurrences of "{company_name}" found in the uploaded file.</p></div>'
+    fuzzy = request.method == 'POST' and bool(request.form.get('fuzzy'))
+    return render_template_string(HTML_TEMPLATE, content=content, workbook=workbook, workbook_key=workbook_key,
+                                  fuzzy=fuzzy, threshold=request.form.get('threshold') or FUZZY_THRESHOLD)
+
+@app.route('/api/counts', methods=['POST'])
+def api_counts():
+    # Sector counts for many companies in one request. Takes a JSON body
+    # {"workbook": <hash from an earlier upload>, "companies": [...], "format": "json"}
+    # or the same form fields with companies one per line, where a file
+    # upload may replace the hash. format csv or xlsx downloads the matrix;
+    # "fuzzy": true with an optional "threshold" counts similar spellings too.
+    data = request.get_json(silent=True) if request.is_json else request.form
+    if data is None:
+        return jsonify({'error': 'invalid JSON body'}), 400
+    if request.is_json and not isinstance(data, dict):
+        return jsonify({'error': 'JSON body must be an object'}), 400
+    companies = data.get('companies', [])
+    if isinstance(companies, str):
+        companies = companies.splitlines()
+    if not isinstance(companies, list) or not all(isinstance(name, str) for name in companies):
+        return jsonify({'error': 'companies must be a list of names'}), 400
+    if not any(name.strip() for name in companies):
+        return jsonify({'error': 'companies is required'}), 400
+    file_format = data.get('format', 'json')
+    if file_format not in ('json', 'csv', 'xlsx'):
+        return jsonify({'error': 'format must be json, csv or xlsx'}), 400
+    try:
+        threshold = fuzzy_threshold(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    file = request.files.get('file')
+    workbook_key = str(data.get('workbook', ''))
+    try:
+        if file:
+            workbook_key, workbook = workbook_cache.load(file.read(), file.filename)
+        else:
+            workbook = workbook_cache.get(workbook_key)
+    except Exception as e:
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 400
+    if workbook is None:
+        return jsonify({'error': 'workbook not found, upload the file again'}), 404
+    matrix = workbook.count_matrix(companies, threshold)
+    if file_format != 'json':
+        return send_matrix(matrix, file_format)
+    sectors = list(matrix.columns[1:])
+    return jsonify({
+        'workbook': workbook_key,
+        'sectors': sectors,
+        'companies': [{'company': company, 'total': int(counts[0]),
+                       'sectors': {sector: int(count) for sector, count in zip(sectors, counts[1:]) if count}}
+                      for company, counts in zip(matrix.index, matrix.to_numpy())]
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5002)  # Run on different port to avoid conflicts
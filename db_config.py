@@ -0,0 +1,164 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Shared database settings for app.py, first.py and the timetable workers.
+# SQLite files get WAL and the pragmas below on every new connection; a
+# DATABASE_URL pointing at PostgreSQL gets a regular connection pool instead.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    # With WAL, NORMAL only syncs at checkpoints and cannot corrupt the database
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 10000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative is KiB: 64 MiB
+    'temp_store': 'MEMORY',
+}
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+
+def database_uri(sqlite_name, *env_names):
+    # First of env_names (then DATABASE_URL) that is set, else a SQLite file
+    # in the Flask instance folder
+    for name in env_names + ('DATABASE_URL',):
+        uri = os.environ.get(name)
+        if uri:
+            # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+            return 'postgresql://' + uri[len('postgres://'):] if uri.startswith('postgres://') else uri
+    return f'sqlite:///{sqlite_name}'
+
+
+def is_memory_sqlite(uri):
+    url = sqlalchemy.engine.make_url(uri)
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+def engine_options(uri):
+    if uri.startswith('sqlite'):
+        # In-memory databases get SQLAlchemy's SingletonThreadPool, which
+        # takes no pool sizes
+        if is_memory_sqlite(uri):
+            return {'connect_args': {'check_same_thread': False}}
+        # busy_timeout is set by pragma; the driver timeout covers the connect itself
+        return {
+            'pool_size': POOL_SIZE,
+            'max_overflow': MAX_OVERFLOW,
+            'connect_args': {'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000, 'check_same_thread': False},
+        }
+    return {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+def init_app(app, sqlite_name, *env_names):
+    uri = database_uri(sqlite_name, *env_names)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+
+def create_engine(uri):
+    # For worker processes outside Flask-SQLAlchemy
+    return sqlalchemy.create_engine(uri, **engine_options(uri))
+
+
+def lock_for_update(session, name):
+    # Serializes transactions that take the same named lock until they end. On
+    # PostgreSQL this is a transaction-level advisory lock; SQLite has a single
+    # writer, so there the transaction's first write statement takes the lock.
+    if session.get_bind().dialect.name == 'postgresql':
+        session.execute(sqlalchemy.text('SELECT pg_advisory_xact_lock(hashtext(:name))'), {'name': name})
+
+
+def add_missing_columns(db, model):
+    # db.create_all() does not alter existing tables, so new columns are added by hand
+    existing = {c['name'] for c in sqlalchemy.inspect(db.engine).get_columns(model.__tablename__)}
+    for column in model.__table__.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(db.engine.dialect)
+            db.session.execute(sqlalchemy.text(f'ALTER TABLE {model.__tablename__} ADD COLUMN {column.name} {column_type}'))
+    db.session.commit()
+
+
+class GroupCommitter:
+    # Runs small, frequent writes from many requests on one writer thread and
+    # commits them together: a group of up to max_batch writes, collected for
+    # at most max_delay seconds, shares a single commit. submit() returns a
+    # Future that resolves once the write is committed. If the group commit
+    # fails, each write is retried in its own transaction so one bad write
+    # does not fail the others.
+
+    def __init__(self, app, db, max_batch=256, max_delay=0.005):
+        self.app = app
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, write, *args):
+        # write(*args) uses db.session without committing; its return value
+        # becomes the Future's result
+        future = Future()
+        self.queue.put((write, args, future))
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                    self.thread.start()
+        return future
+
+    def _collect(self):
+        group = [self.queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_batch:
+            try:
+                group.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        while True:
+            group = self._collect()
+            with self.app.app_context():
+                session = self.db.session
+                try:
+                    results = [write(*args) for write, args, _ in group]
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    for write, args, future in group:
+                        try:
+                            result = write(*args)
+                            session.commit()
+                            future.set_result(result)
+                        except Exception as e:
+                            session.rollback()
+                            future.set_exception(e)
+                    continue
+                for (_, _, future), result in zip(group, results):
+                    future.set_result(result)
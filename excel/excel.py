@@ -1,24 +1,40 @@
-import pandas as pd
+import os
+import sys
 
-# Load Excel file
-file = "your_excel_file.xlsx"
-xls = pd.ExcelFile(file)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import excel_ingest  # noqa: E402
 
-# Show available sheet names (titles of sheets)
-print("Sheets in this Excel file:")
-for i, sheet in enumerate(xls.sheet_names, start=1):
-    print(f"{i}. {sheet}")
+# Parsed workbooks are kept here so running the script again on the same file skips parsing
+CACHE_DIR = os.environ.get('EXCEL_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'excel_ingest'))
 
-# Select a sheet
-sheet_name = input("Enter sheet name to check: ")
-df = pd.read_excel(file, sheet_name=sheet_name)
 
-# Show column titles
-print("\nAvailable Columns:")
-print(df.columns.tolist())
+def main():
+    # Load Excel file
+    file = sys.argv[1] if len(sys.argv) > 1 else "your_excel_file.xlsx"
+    with open(file, 'rb') as f:
+        data = f.read()
+    cache = excel_ingest.ColumnarCache(CACHE_DIR)
+    sheet_names = cache.manifest(cache.key(data)) or excel_ingest.sheet_names(file)
 
-# Search for a specific name in the whole sheet
-search_name = input("\nEnter name to count: ")
-count = df.apply(lambda row: row.astype(str).str.contains(search_name, case=False)).sum().sum()
+    # Show available sheet names (titles of sheets)
+    print("Sheets in this Excel file:")
+    for i, sheet in enumerate(sheet_names, start=1):
+        print(f"{i}. {sheet}")
 
-print(f"\n'{search_name}' is repeated {count} times in sheet '{sheet_name}'.")
\ No newline at end of file
+    # Select a sheet
+    sheet_name = input("Enter sheet name to check: ")
+    [(_, df)] = excel_ingest.read_workbook(data, names=[sheet_name], cache=cache)
+
+    # Show column titles
+    print("\nAvailable Columns:")
+    print(df.columns.tolist())
+
+    # Search for a specific name in the whole sheet
+    search_name = input("\nEnter name to count: ")
+    count = df.apply(lambda row: row.astype(str).str.contains(search_name, case=False)).sum().sum()
+
+    print(f"\n'{search_name}' is repeated {count} times in sheet '{sheet_name}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401
+except ImportError:
+    python_calamine = None
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+# Reads .xlsx sheets as DataFrames of strings, the way
+# pd.read_excel(dtype=str).fillna('') does: blanks and pandas' default NA
+# markers become '', whole-number floats lose their '.0'.
+#   calamine   pandas with the Rust calamine reader, if python-calamine is installed
+#   openpyxl   openpyxl in read-only streaming mode, converting only the kept columns
+#   pandas     pd.read_excel with its default engine
+ENGINE = os.environ.get('EXCEL_ENGINE', 'calamine' if python_calamine else 'openpyxl')
+MAX_WORKERS = int(os.environ.get('EXCEL_WORKERS', os.cpu_count() or 1))
+CACHE_MAX_BYTES = int(os.environ.get('EXCEL_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+# Sheets are converted once to this format for repeat loads
+COLUMNAR_FORMAT = 'parquet' if pyarrow else 'pickle'
+NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+             'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value)
+    return '' if text in NA_VALUES else text
+
+
+def column_names(header, width):
+    # Header cells named as pandas names them: blanks become 'Unnamed: <i>'
+    # and repeats get '.1', '.2', ...
+    names = []
+    seen = {}
+    for i in range(width):
+        value = header[i] if i < len(header) else None
+        name = f'Unnamed: {i}' if value is None else value
+        while name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        seen[name] = 0
+        names.append(name)
+    return names
+
+
+def read_sheet_openpyxl(path, sheet_name, skip_columns=()):
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = list(workbook[sheet_name].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+    # Trailing empty rows and cells are dropped, as pandas does
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    if not rows:
+        return pd.DataFrame()
+    width = max(max((i + 1 for i, value in enumerate(row) if value is not None), default=0) for row in rows)
+    names = column_names(rows[0], width)
+    data = {}
+    for i, name in enumerate(names):
+        if name not in skip_columns:
+            data[name] = [to_text(row[i]) if i < len(row) else '' for row in rows[1:]]
+    return pd.DataFrame(data, index=range(len(rows) - 1), dtype=object,
+                        columns=[name for name in names if name not in skip_columns])
+
+
+def read_sheet_pandas(path, sheet_name, skip_columns=(), engine=None):
+    df = pd.read_excel(path, sheet_name=sheet_name, dtype=str, engine=engine).fillna('')
+    return df.drop(columns=[name for name in skip_columns if name in df.columns])
+
+
+def read_sheet(path, sheet_name, skip_columns=(), engine=ENGINE):
+    if engine == 'openpyxl':
+        return read_sheet_openpyxl(path, sheet_name, skip_columns)
+    return read_sheet_pandas(path, sheet_name, skip_columns, 'calamine' if engine == 'calamine' else None)
+
+
+def sheet_names(path):
+    workbook = openpyxl.load_workbook(path, read_only=True, keep_links=False)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def _read_sheet_args(args):
+    return read_sheet(*args)
+
+
+def read_sheets(path, names, skip_columns=(), engine=ENGINE):
+    # [(sheet name, DataFrame)] for the named sheets. With more than one
+    # sheet and worker, sheets are parsed in the process pool.
+    skip_columns = tuple(skip_columns)
+    if len(names) > 1 and MAX_WORKERS > 1:
+        frames = get_executor().map(_read_sheet_args, [(path, name, skip_columns, engine) for name in names])
+    else:
+        frames = (read_sheet(path, name, skip_columns, engine) for name in names)
+    return list(zip(names, frames))
+
+
+class ColumnarCache:
+    # Workbooks converted once into one columnar file per sheet, keyed by a
+    # hash of the file contents and the skipped columns. A later load reads
+    # back only the sheets it asks for. Least recently used workbooks are
+    # removed once the directory passes max_bytes.
+
+    def __init__(self, directory, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(data, skip_columns=()):
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(sorted(map(str, skip_columns))).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def manifest(self, key):
+        # Sheet names in workbook order, or None if the workbook is not cached
+        try:
+            with open(os.path.join(self.path(key), 'manifest.json')) as f:
+                names = json.load(f)
+        except FileNotFoundError:
+            return None
+        os.utime(self.path(key))
+        return names
+
+    def load(self, key, names):
+        manifest = self.manifest(key)
+        check_names(names, manifest)
+        return [(name, self._load_sheet(key, manifest.index(name))) for name in names]
+
+    def _load_sheet(self, key, position):
+        path = os.path.join(self.path(key), f'{position}.{COLUMNAR_FORMAT}')
+        if COLUMNAR_FORMAT == 'parquet':
+            return pd.read_parquet(path).astype(object)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def store(self, key, sheets):
+        # Written to a temporary directory and renamed, so readers never see
+        # a workbook half written
+        tmp_path = tempfile.mkdtemp(dir=self.directory, suffix='.tmp')
+        for position, (_, df) in enumerate(sheets):
+            path = os.path.join(tmp_path, f'{position}.{COLUMNAR_FORMAT}')
+            if COLUMNAR_FORMAT == 'parquet':
+                df.rename(columns=str).to_parquet(path)
+            else:
+                with open(path, 'wb') as f:
+                    pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump([name for name, _ in sheets], f)
+        try:
+            os.rename(tmp_path, self.path(key))
+        except OSError:
+            # Another process stored the same workbook first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and not entry.name.endswith('.tmp'):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                return
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def check_names(names, available):
+    for name in names:
+        if name not in available:
+            raise ValueError(f'Worksheet named {name!r} not found')
+
+
+def read_workbook(data, names=None, skip_columns=(), cache=None, engine=ENGINE):
+    # [(sheet name, DataFrame)] for workbook bytes, all sheets unless names
+    # picks some. With a ColumnarCache the workbook is parsed only the first
+    # time, and then every sheet is parsed so the cache entry is complete.
+    key = cache.key(data, skip_columns) if cache else None
+    manifest = cache.manifest(key) if cache else None
+    if manifest is not None:
+        return cache.load(key, manifest if names is None else names)
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        available = sheet_names(path)
+        check_names(names or [], available)
+        sheets = read_sheets(path, available if cache or names is None else names, skip_columns, engine)
+    finally:
+        os.remove(path)
+    if cache:
+        cache.store(key, sheets)
+        if names is not None:
+            sheets = [sheet for name in names for sheet in sheets if sheet[0] == name]
+    return sheets
@@ -1,14 +1,18 @@
-from flask import Flask, request, redirect, url_for, flash, render_template_string
+from flask import Flask, request, redirect, url_for, flash, render_template_string, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from ortools.sat.python import cp_model
+from timetable_solver import DAYS, DEFAULT_PARAMETERS, INCREMENTAL_PARAMETERS, slot_index
+from datetime import datetime
+import db_config
+import timetable_jobs
+import json
+import multiprocessing
 import os
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_secret_key_here')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///smart_timetable.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+db_config.init_app(app, 'smart_timetable.db', 'TIMETABLE_DATABASE_URL')
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
@@ -71,9 +75,18 @@ class LunchBreak(db.Model):
     end_time = db.Column(db.String(10), nullable=False)
     batch = db.relationship('Batch', backref='lunchbreaks')
 
+class ScheduleVersion(db.Model):
+    __tablename__ = 'schedule_versions'
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('timetable_jobs.id'))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    is_current = db.Column(db.Boolean, nullable=False, default=False)
+
 class Schedule(db.Model):
     __tablename__ = 'schedules'
     id = db.Column(db.Integer, primary_key=True)
+    version_id = db.Column(db.Integer, db.ForeignKey('schedule_versions.id'), index=True)
     batch_id = db.Column(db.Integer, db.ForeignKey('batches.id'), nullable=False)
     subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=False)
     faculty_id = db.Column(db.Integer, db.ForeignKey('faculty.id'), nullable=False)
@@ -85,6 +98,43 @@ class Schedule(db.Model):
     faculty = db.relationship('Faculty')
     classroom = db.relationship('Classroom')
 
+class TimetableJob(db.Model):
+    __tablename__ = 'timetable_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    mode = db.Column(db.String(20), default='full')
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    objective = db.Column(db.Float)
+    best_bound = db.Column(db.Float)
+    wall_time = db.Column(db.Float)
+    solutions = db.Column(db.Integer, default=0)
+    message = db.Column(db.String(500))
+    diff = db.Column(db.Text)
+    solver_status = db.Column(db.String(20))
+    parameters = db.Column(db.Text)
+    progress = db.Column(db.Text)
+    schedule_version_id = db.Column(db.Integer)
+
+class SolverProfile(db.Model):
+    __tablename__ = 'solver_profiles'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    max_time_in_seconds = db.Column(db.Float, nullable=False, default=DEFAULT_PARAMETERS['max_time_in_seconds'])
+    num_search_workers = db.Column(db.Integer, nullable=False, default=0)
+    relative_gap_limit = db.Column(db.Float, nullable=False, default=0.0)
+    objective_mode = db.Column(db.String(20), nullable=False, default='optimize')
+    is_default = db.Column(db.Boolean, nullable=False, default=False)
+    def parameters(self):
+        return {
+            'max_time_in_seconds': self.max_time_in_seconds,
+            'num_search_workers': self.num_search_workers,
+            'relative_gap_limit': self.relative_gap_limit,
+            'objective_mode': self.objective_mode
+        }
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -92,6 +142,20 @@ def load_user(user_id):
 def setup_database():
     with app.app_context():
         db.create_all()
+        db_config.add_missing_columns(db, TimetableJob)
+        db_config.add_missing_columns(db, Schedule)
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_schedules_version_id ON schedules (version_id)'))
+        # Schedules written before versioning become the first, current version
+        unversioned = Schedule.query.filter(Schedule.version_id.is_(None))
+        if unversioned.first():
+            version = ScheduleVersion(row_count=unversioned.count(), is_current=True)
+            db.session.add(version)
+            db.session.flush()
+            unversioned.update({Schedule.version_id: version.id}, synchronize_session=False)
+        db.session.commit()
+        if not SolverProfile.query.first():
+            db.session.add(SolverProfile(name='default', is_default=True, **DEFAULT_PARAMETERS))
+            db.session.commit()
         if not User.query.filter_by(username='admin').first():
             admin = User(username='admin', role='admin')
             admin.set_password('admin123')
@@ -110,7 +174,10 @@ def setup_database():
                 ])
             db.session.commit()
 
-setup_database()
+# Timetable job workers are spawned and re-import this module as __mp_main__
+# under `python first.py`; only the serving process migrates the database.
+if multiprocessing.parent_process() is None:
+    setup_database()
 
 BASE_TEMPLATE = '''
 <!DOCTYPE html>
@@ -225,12 +292,15 @@ def dashboard():
         links.append('<p><a href="/add_entity/subject" class="admin-only">Add Subject</a></p>')
         links.append('<p><a href="/add_entity/batch" class="admin-only">Add Batch</a></p>')
         links.append('<p><a href="/add_lunchbreak" class="admin-only">Add Lunch Break</a></p>')
+        links.append('<p><a href="/solver_profiles" class="admin-only">Solver Profiles</a></p>')
     dashboard_content = f'''
     <p>Welcome, <strong>{current_user.username}</strong>!</p>
     <p>Your role: <span class="{'admin-only' if current_user.role == 'admin' else ''}">{current_user.role}</span></p>
     {"".join(links)}
     <p><a href="/view_timetable">View Timetable</a></p>
     <p><a href="/generate_timetable">Generate Timetable</a></p>
+    <p><a href="/generate_timetable?mode=incremental">Update Timetable (incremental)</a></p>
+    <p><a href="/generate_timetable?mode=partitioned">Generate Timetable (per department, parallel)</a></p>
     '''
     return render_template_string(BASE_TEMPLATE, title='Dashboard', content=dashboard_content)
 
@@ -333,6 +403,7 @@ def add_lunchbreak():
             )
             db.session.add(lb)
             db.session.commit()
+            clear_timetable_cache()
             flash('Lunch break added successfully.', 'success')
             return redirect(url_for('add_lunchbreak'))
         except Exception as e:
@@ -380,111 +451,228 @@ def view_data():
             content += '<p>No data</p>'
     return render_template_string(BASE_TEMPLATE, title='View Data', content=content)
 
+def load_problem():
+    return {
+        'batches': [{'id': b.id, 'students': b.students}
+                    for b in Batch.query.order_by(Batch.program, Batch.semester)],
+        'subjects': [{'id': s.id, 'department_id': s.department_id, 'weekly_classes': s.weekly_classes}
+                     for s in Subject.query.order_by(Subject.name)],
+        'faculty': [{'id': f.id, 'department_id': f.department_id, 'max_load': f.max_load, 'availability': f.availability or ''}
+                    for f in Faculty.query.order_by(Faculty.name)],
+        'classrooms': [{'id': c.id, 'capacity': c.capacity}
+                       for c in Classroom.query.order_by(Classroom.name)],
+        'lunchbreaks': [{'batch_id': lb.batch_id, 'day': lb.day, 'start_time': lb.start_time}
+                        for lb in LunchBreak.query.all()],
+    }
+
+def solver_parameters(args, mode='full'):
+    # The chosen (or default) profile, with any per-request overrides applied on
+    # top; incremental jobs without a chosen profile get the short repair limit
+    if args.get('profile_id'):
+        profile = db.session.get(SolverProfile, args.get('profile_id', type=int))
+        if not profile:
+            raise ValueError('Solver profile does not exist.')
+    else:
+        profile = SolverProfile.query.filter_by(is_default=True).first()
+    parameters = profile.parameters() if profile else dict(DEFAULT_PARAMETERS)
+    if mode == 'incremental' and not args.get('profile_id'):
+        parameters.update(INCREMENTAL_PARAMETERS)
+    for name, cast in (('max_time_in_seconds', float), ('num_search_workers', int), ('relative_gap_limit', float)):
+        if args.get(name):
+            parameters[name] = cast(args[name])
+    if args.get('objective_mode'):
+        parameters['objective_mode'] = args['objective_mode']
+    if parameters['objective_mode'] not in ('feasible', 'optimize'):
+        raise ValueError('objective_mode must be feasible or optimize.')
+    if parameters['max_time_in_seconds'] <= 0 or parameters['num_search_workers'] < 0 or parameters['relative_gap_limit'] < 0:
+        raise ValueError('Time limit must be positive, workers and gap limit cannot be negative.')
+    return parameters
+
+@app.route('/solver_profiles', methods=['GET', 'POST'])
+@login_required
+def solver_profiles():
+    if current_user.role != 'admin':
+        flash('Only admins can manage solver profiles.', 'error')
+        return redirect(url_for('dashboard'))
+    if request.method == 'POST':
+        try:
+            parameters = solver_parameters({'objective_mode': 'optimize', **request.form.to_dict()})
+            profile = SolverProfile.query.filter_by(name=request.form['name']).first() or SolverProfile(name=request.form['name'])
+            for name, value in parameters.items():
+                setattr(profile, name, value)
+            if request.form.get('is_default'):
+                SolverProfile.query.update({SolverProfile.is_default: False})
+                profile.is_default = True
+            db.session.add(profile)
+            db.session.commit()
+            flash('Solver profile saved.', 'success')
+            return redirect(url_for('solver_profiles'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error saving solver profile: {str(e)}', 'error')
+    rows = ''
+    for p in SolverProfile.query.order_by(SolverProfile.name):
+        rows += f'<tr><td>{p.name}{" (default)" if p.is_default else ""}</td><td>{p.max_time_in_seconds}</td><td>{p.num_search_workers or "all cores"}</td><td>{p.relative_gap_limit}</td><td>{p.objective_mode}</td><td><a href="/generate_timetable?profile_id={p.id}">Generate</a></td></tr>'
+    content = f'''
+    <h2>Solver Profiles</h2>
+    <table><thead><tr><th>Name</th><th>Time Limit (s)</th><th>Workers</th><th>Gap Limit</th><th>Mode</th><th></th></tr></thead><tbody>{rows}</tbody></table>
+    <h3>Add or Update Profile</h3>
+    <form method="post">
+        <label>Name</label><input name="name" required />
+        <label>Max Time In Seconds</label><input name="max_time_in_seconds" type="number" step="any" value="{DEFAULT_PARAMETERS['max_time_in_seconds']}" required />
+        <label>Num Search Workers (0 = all cores)</label><input name="num_search_workers" type="number" value="0" required />
+        <label>Relative Gap Limit</label><input name="relative_gap_limit" type="number" step="any" value="0" required />
+        <label>Objective Mode</label><select name="objective_mode">
+            <option value="optimize">Optimize</option><option value="feasible">First feasible</option>
+        </select>
+        <label><input name="is_default" type="checkbox" value="1" style="width:auto" /> Use as default</label>
+        <button type="submit">Save</button>
+    </form>
+    <p><a href="/dashboard">Back to Dashboard</a></p>
+    '''
+    return render_template_string(BASE_TEMPLATE, title='Solver Profiles', content=content)
+
 @app.route('/generate_timetable')
 @login_required
 def generate_timetable():
     if current_user.role != 'admin':
         flash('Only admins can generate timetables.', 'error')
         return redirect(url_for('dashboard'))
-    model = cp_model.CpModel()
-    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
-    hours = ['9-10am', '10-11am', '11-12pm', '1-2pm', '2-3pm']
-    batches = Batch.query.order_by(Batch.program, Batch.semester).all()
-    subjects = Subject.query.order_by(Subject.name).all()
-    faculty = Faculty.query.order_by(Faculty.name).all()
-    classrooms = Classroom.query.order_by(Classroom.name).all()
-    lunchbreaks = LunchBreak.query.all()
-
-    timetable_vars = {}
-    for b in batches:
-        for s in subjects:
-            for d in days:
-                for h in hours:
-                    for c in classrooms:
-                        for f in faculty:
-                            if f.department_id == s.department_id:
-                                timetable_vars[(b.id, s.id, d, h, c.id, f.id)] = model.NewBoolVar(f'b{b.id}_s{s.id}_d{d}_h{h}_c{c.id}_f{f.id}')
-
-    # Each subject must meet weekly_classes times per batch
-    for b in batches:
-        for s in subjects:
-            vars = [timetable_vars[(b.id, s.id, d, h, c.id, f.id)]
-                   for d in days for h in hours for c in classrooms for f in faculty if (b.id, s.id, d, h, c.id, f.id) in timetable_vars]
-            model.Add(sum(vars) == s.weekly_classes)
-
-    # Prevent double-booking of classrooms
-    for d in days:
-        for h in hours:
-            for c in classrooms:
-                vars = [timetable_vars[(b.id, s.id, d, h, c.id, f.id)]
-                      for b in batches for s in subjects for f in faculty if (b.id, s.id, d, h, c.id, f.id) in timetable_vars]
-                model.Add(sum(vars) <= 1)
-
-    # Faculty max load
-    for f in faculty:
-        vars = [timetable_vars[(b.id, s.id, d, h, c.id, f.id)]
-              for b in batches for s in subjects for d in days for h in hours for c in classrooms if (b.id, s.id, d, h, c.id, f.id) in timetable_vars]
-        model.Add(sum(vars) <= f.max_load)
-
-    # Lunch break constraints
-    for lb in lunchbreaks:
-        for s in subjects:
-            for c in classrooms:
-                for f in faculty:
-                    if (lb.batch_id, s.id, lb.day, lb.start_time, c.id, f.id) in timetable_vars:
-                        model.Add(timetable_vars[(lb.batch_id, s.id, lb.day, lb.start_time, c.id, f.id)] == 0)
-
-    solver = cp_model.CpSolver()
-    status = solver.Solve(model)
-    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-        Schedule.query.delete()
-        db.session.commit()
-        for key in timetable_vars:
-            if solver.Value(timetable_vars[key]) == 1:
-                (batch_id, subject_id, day, hour, classroom_id, faculty_id) = key
-                db.session.add(Schedule(
-                    batch_id=batch_id,
-                    subject_id=subject_id,
-                    faculty_id=faculty_id,
-                    classroom_id=classroom_id,
-                    day=day,
-                    time_slot=hour
-                ))
-        db.session.commit()
-        flash('Timetable generated successfully.', 'success')
-    else:
-        flash('No feasible schedule found with current constraints.', 'error')
-    return redirect(url_for('view_timetable'))
+    mode = request.args.get('mode', 'full')
+    if mode not in ('full', 'incremental', 'partitioned'):
+        flash('Invalid generation mode.', 'error')
+        return redirect(url_for('dashboard'))
+    reopen = {
+        'batch_ids': request.args.getlist('batch_id', type=int),
+        'faculty_ids': request.args.getlist('faculty_id', type=int),
+        'classroom_ids': request.args.getlist('classroom_id', type=int)
+    }
+    try:
+        parameters = solver_parameters(request.args, mode)
+    except ValueError as e:
+        flash(f'Invalid solver settings: {str(e)}', 'error')
+        return redirect(url_for('solver_profiles'))
+    job = TimetableJob(status='queued', mode=mode, created_by=current_user.id, parameters=json.dumps(parameters))
+    db.session.add(job)
+    db.session.commit()
+    timetable_jobs.submit(job.id, load_problem(), db.engine.url.render_as_string(hide_password=False), mode, reopen, parameters)
+    status_url = url_for('timetable_job_status', job_id=job.id)
+    content = f'''
+    <h2>Generating Timetable</h2>
+    <p>Job #{job.id} has been queued. This page updates while the solver runs.</p>
+    <table><tbody>
+        <tr><th>Status</th><td id="job-status">queued</td></tr>
+        <tr><th>Solver status</th><td id="job-solver-status">-</td></tr>
+        <tr><th>Solutions found</th><td id="job-solutions">0</td></tr>
+        <tr><th>Objective</th><td id="job-objective">-</td></tr>
+        <tr><th>Best bound</th><td id="job-bound">-</td></tr>
+        <tr><th>Wall time (s)</th><td id="job-wall-time">-</td></tr>
+        <tr><th>Mode</th><td>{job.mode}</td></tr>
+        <tr><th>Message</th><td id="job-message"></td></tr>
+    </tbody></table>
+    <p><a href="/view_timetable">View Timetable</a></p>
+    <script>
+    function poll() {{
+        fetch("{status_url}").then(r => r.json()).then(job => {{
+            document.getElementById("job-status").textContent = job.status;
+            document.getElementById("job-solver-status").textContent = job.solver_status ?? "-";
+            document.getElementById("job-solutions").textContent = job.solutions;
+            document.getElementById("job-objective").textContent = job.objective ?? "-";
+            document.getElementById("job-bound").textContent = job.best_bound ?? "-";
+            document.getElementById("job-wall-time").textContent = job.wall_time ? job.wall_time.toFixed(2) : "-";
+            document.getElementById("job-message").textContent = job.message ?? "";
+            if (job.status === "queued" || job.status === "running") setTimeout(poll, 1000);
+        }});
+    }}
+    poll();
+    </script>
+    '''
+    return render_template_string(BASE_TEMPLATE, title='Generating Timetable', content=content)
+
+@app.route('/generate_timetable/status/<int:job_id>')
+@login_required
+def timetable_job_status(job_id):
+    job = db.session.get(TimetableJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found.'}), 404
+    return jsonify({
+        'id': job.id,
+        'status': job.status,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'objective': job.objective,
+        'best_bound': job.best_bound,
+        'wall_time': job.wall_time,
+        'solutions': job.solutions,
+        'message': job.message,
+        'mode': job.mode,
+        'solver_status': job.solver_status,
+        'parameters': json.loads(job.parameters) if job.parameters else None,
+        'progress': json.loads(job.progress) if job.progress else [],
+        'diff': json.loads(job.diff) if job.diff else None
+    })
+
+TIMETABLE_TEMPLATE = '''
+<h2>Generated Timetable</h2>
+{% for grid in grids %}
+    <h3>{{ grid.name }}</h3>
+    <table>
+        <thead><tr><th>Day</th><th>Time</th><th>Subject</th><th>Faculty</th><th>Classroom</th></tr></thead>
+        <tbody>
+        {% for row in grid.rows %}
+            <tr{% if row.lunch %} class="lunch-break"{% endif %}><td>{{ row.day }}</td><td>{{ row.time_slot }}</td><td>{{ row.subject }}</td><td>{{ row.faculty }}</td><td>{{ row.classroom }}</td></tr>
+        {% endfor %}
+        </tbody>
+    </table>
+{% else %}
+    <p>No timetable generated yet.</p>
+{% endfor %}
+<p><a href="/dashboard">Back to Dashboard</a></p>
+'''
+
+# Per-batch grids of the current schedule version. A new version written by a
+# timetable job changes the key, so stale grids are never served. The version
+# and its grids are stored as one tuple, built aside and swapped in by a single
+# assignment, so concurrent requests never see a partly filled entry.
+timetable_cache = {'entry': (None, [])}
+
+def clear_timetable_cache():
+    timetable_cache['entry'] = (None, [])
+
+def timetable_grids(version_id):
+    if version_id is None:
+        return []
+    cached_version_id, cached_grids = timetable_cache['entry']
+    if cached_version_id == version_id:
+        return cached_grids
+    schedules = (Schedule.query.filter_by(version_id=version_id)
+                 .options(db.joinedload(Schedule.batch), db.joinedload(Schedule.subject),
+                          db.joinedload(Schedule.faculty), db.joinedload(Schedule.classroom))
+                 .all())
+    batch_ids = {s.batch_id for s in schedules}
+    lunch_slots = {(lb.batch_id, slot_index(lb.day, lb.start_time))
+                   for lb in LunchBreak.query.filter(LunchBreak.batch_id.in_(batch_ids))}
+    grids = {}
+    for s in sorted(schedules, key=lambda x: (x.batch.program, x.batch.semester, DAYS.index(x.day), slot_index(x.day, x.time_slot) or 0)):
+        grid = grids.setdefault(s.batch_id, {'name': f'{s.batch.program} (Sem {s.batch.semester})', 'rows': []})
+        grid['rows'].append({
+            'day': s.day,
+            'time_slot': s.time_slot,
+            'subject': s.subject.name,
+            'faculty': s.faculty.name,
+            'classroom': s.classroom.name,
+            'lunch': (s.batch_id, slot_index(s.day, s.time_slot)) in lunch_slots
+        })
+    grids = list(grids.values())
+    timetable_cache['entry'] = (version_id, grids)
+    return grids
 
 @app.route('/view_timetable')
 @login_required
 def view_timetable():
-    schedules = Schedule.query.all()
-    content = '<h2>Generated Timetable</h2>'
-    if not schedules:
-        content += '<p>No timetable generated yet.</p>'
-    else:
-        timetable = {}
-        for s in schedules:
-            batch_name = f"{s.batch.program} (Sem {s.batch.semester})"
-            if batch_name not in timetable:
-                timetable[batch_name] = []
-            timetable[batch_name].append(s)
-        for batch in timetable:
-            batch_id = Batch.query.filter_by(program=batch.split(' (')[0]).first().id
-            lunches = LunchBreak.query.filter_by(batch_id=batch_id).all()
-            lunch_slots = {(lb.day, lb.start_time) for lb in lunches}
-            timetable[batch] = sorted(
-                timetable[batch],
-                key=lambda x: (['Mon','Tue','Wed','Thu','Fri'].index(x.day), x.time_slot)
-            )
-            content += f'<h3>{batch}</h3><table><thead><tr><th>Day</th><th>Time</th><th>Subject</th><th>Faculty</th><th>Classroom</th></tr></thead><tbody>'
-            for sch in timetable[batch]:
-                is_lunch = (sch.day, sch.time_slot) in lunch_slots
-                row_class = ' class="lunch-break"' if is_lunch else ''
-                content += f'<tr{row_class}><td>{sch.day}</td><td>{sch.time_slot}</td><td>{sch.subject.name}</td><td>{sch.faculty.name}</td><td>{sch.classroom.name}</td></tr>'
-            content += '</tbody></table>'
-    content += '<p><a href="/dashboard">Back to Dashboard</a></p>'
+    version_id = db.session.query(ScheduleVersion.id).filter_by(is_current=True).scalar()
+    content = render_template_string(TIMETABLE_TEMPLATE, grids=timetable_grids(version_id))
     return render_template_string(BASE_TEMPLATE, title='Timetable', content=content)
 
 if __name__ == '__main__':
@@ -0,0 +1,52 @@
+import json
+import zlib
+
+# Compact QR payload: "RF<version>:<fitting id in base 36>:<checksum>". It only
+# uses characters of the QR alphanumeric mode, so codes stay at version 1-2.
+# Codes printed before this format hold the full JSON of the fitting and are
+# decoded as version 0.
+PREFIX = 'RF'
+VERSION = 1
+LEGACY_VERSION = 0
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def to_base36(number):
+    if number < 0:
+        raise ValueError('negative id')
+    text = ''
+    while True:
+        number, digit = divmod(number, 36)
+        text = DIGITS[digit] + text
+        if not number:
+            return text
+
+
+def checksum(body):
+    value = zlib.crc32(body.encode()) % (36 * 36)
+    return DIGITS[value // 36] + DIGITS[value % 36]
+
+
+def encode(fitting_id):
+    body = f'{PREFIX}{VERSION}:{to_base36(fitting_id)}'
+    return f'{body}:{checksum(body)}'
+
+
+def decode(text):
+    # Returns (version, data): data is the fitting id for compact payloads and
+    # the stored fields for legacy JSON. Raises ValueError on anything else.
+    text = text.strip()
+    if text.startswith('{'):
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError('legacy payload is not an object')
+        return LEGACY_VERSION, data
+    parts = text.upper().split(':')
+    if len(parts) != 3 or not parts[0].startswith(PREFIX):
+        raise ValueError('not a fitting QR code')
+    if parts[0] != f'{PREFIX}{VERSION}':
+        raise ValueError(f'unsupported QR payload version {parts[0][len(PREFIX):]!r}')
+    body = f'{parts[0]}:{parts[1]}'
+    if checksum(body) != parts[2]:
+        raise ValueError('QR checksum does not match')
+    return VERSION, int(parts[1], 36)
@@ -0,0 +1,176 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from io import BytesIO
+
+import qrcode
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+MAX_WORKERS = int(os.environ.get('QR_WORKERS', os.cpu_count() or 1))
+CHUNK_SIZE = 64
+BATCH_MASK_PATTERN = 0
+CACHE_MAX_BYTES = int(os.environ.get('QR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Label sheet layout in points: 3 x 7 labels on a letter page
+LABEL_COLUMNS = 3
+LABEL_ROWS = 7
+LABEL_MARGIN = 18
+LABEL_QR_SIZE = 72
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def render_png(qr_data, box_size=10, border=5, mask_pattern=None):
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=border, mask_pattern=mask_pattern)
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    img = qr.make_image(fill='black', back_color='white')
+    img_io = BytesIO()
+    img.save(img_io, 'PNG')
+    return img_io.getvalue()
+
+
+def render_batch_png(qr_data):
+    # Choosing the best mask renders the code eight times; every mask scans,
+    # so batches use a fixed one
+    return render_png(qr_data, mask_pattern=BATCH_MASK_PATTERN)
+
+
+class ImageCache:
+    # Content-addressed PNG cache on disk. Files are named after a hash of the
+    # payload and how it was rendered, a hit refreshes the file's mtime and
+    # the least recently used files are evicted once the directory grows past
+    # max_bytes. Writes go through a rename, so several processes can share
+    # one directory.
+
+    def __init__(self, directory, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None  # unknown until the first eviction scan
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(qr_data, variant='png'):
+        return hashlib.sha256(f'{variant}:{qr_data}'.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.png')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if self.size is None or self.size + len(data) > self.max_bytes:
+            self.evict()
+        else:
+            self.size += len(data)
+        return path
+
+    def fetch(self, qr_data, render=render_png, variant='png'):
+        # (key, path) of the cached image, rendering it on a miss
+        key = self.key(qr_data, variant)
+        return key, self.get(key) or self.put(key, render(qr_data))
+
+    def evict(self):
+        # Trims to 90% of the cap so eviction does not run on every write
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                files.extend((f.stat().st_mtime, f.stat().st_size, f.path) for f in os.scandir(entry.path))
+        self.size = sum(size for _, size, _ in files)
+        if self.size <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+            if self.size <= self.max_bytes * 0.9:
+                return
+
+
+_caches = {}
+
+
+def cached_batch_png(cache_dir, qr_data):
+    cache = _caches.get(cache_dir)
+    if cache is None:
+        cache = _caches[cache_dir] = ImageCache(cache_dir)
+    _, path = cache.fetch(qr_data, render_batch_png, 'batch')
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def render_many(payloads, cache_dir=None):
+    # PNG bytes for each payload, in order, rendered across all cores
+    if cache_dir:
+        return get_executor().map(partial(cached_batch_png, cache_dir), payloads, chunksize=CHUNK_SIZE)
+    return get_executor().map(render_batch_png, payloads, chunksize=CHUNK_SIZE)
+
+
+class StreamBuffer:
+    # Write-only file object for zipfile; the caller drains it after each write
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class LabelSheet:
+    # Print-ready label pages: each label is a QR code with a caption under it
+    def __init__(self, fileobj, pagesize=letter):
+        self.canvas = canvas.Canvas(fileobj, pagesize=pagesize)
+        self.width, self.height = pagesize
+        self.cell_width = (self.width - 2 * LABEL_MARGIN) / LABEL_COLUMNS
+        self.cell_height = (self.height - 2 * LABEL_MARGIN) / LABEL_ROWS
+        self.count = 0
+
+    def add(self, png, caption):
+        position = self.count % (LABEL_COLUMNS * LABEL_ROWS)
+        if self.count and position == 0:
+            self.canvas.showPage()
+        row, column = divmod(position, LABEL_COLUMNS)
+        x = LABEL_MARGIN + column * self.cell_width
+        y = self.height - LABEL_MARGIN - (row + 1) * self.cell_height
+        self.canvas.drawImage(ImageReader(BytesIO(png)), x + (self.cell_width - LABEL_QR_SIZE) / 2,
+                              y + self.cell_height - LABEL_QR_SIZE - 6, LABEL_QR_SIZE, LABEL_QR_SIZE)
+        self.canvas.setFont('Helvetica', 7)
+        self.canvas.drawCentredString(x + self.cell_width / 2, y + self.cell_height - LABEL_QR_SIZE - 16, caption)
+        self.count += 1
+
+    def save(self):
+        self.canvas.save()
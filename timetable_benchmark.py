@@ -0,0 +1,140 @@
+import random
+import sys
+import time
+
+from ortools.sat.python import cp_model
+from timetable_solver import DAYS, HOURS, RoomModel, TimetableModel, solve_partitioned
+
+# (batches, subjects, classrooms, faculty, departments)
+SIZES = [
+    (2, 4, 3, 4, 2),
+    (4, 8, 6, 8, 2),
+    (8, 12, 10, 16, 3),
+    (16, 20, 24, 40, 4),
+    (40, 30, 60, 200, 6),
+]
+LEGACY_VAR_LIMIT = 2_000_000
+SOLVE_TIME_LIMIT = 60.0
+
+
+def generate_problem(num_batches, num_subjects, num_rooms, num_faculty, num_departments, seed=0):
+    rng = random.Random(seed)
+    slots = len(DAYS) * len(HOURS)
+    # Keep the instance feasible: total weekly classes must fit into the room-slots
+    weekly = max(1, min(3, (num_rooms * slots) // (2 * num_batches * num_subjects)))
+    problem = {
+        'batches': [{'id': i + 1, 'students': rng.randint(30, 90)} for i in range(num_batches)],
+        'subjects': [{'id': i + 1, 'department_id': i % num_departments + 1, 'weekly_classes': weekly}
+                     for i in range(num_subjects)],
+        'faculty': [{'id': i + 1, 'department_id': i % num_departments + 1, 'max_load': 10_000, 'availability': ''}
+                    for i in range(num_faculty)],
+        'classrooms': [{'id': i + 1, 'capacity': rng.choice([40, 60, 90, 120])} for i in range(num_rooms)],
+        'lunchbreaks': [{'batch_id': i + 1, 'day': rng.choice(DAYS), 'start_time': '1-2pm'}
+                        for i in range(num_batches)],
+    }
+    return problem
+
+
+def legacy_variable_count(problem):
+    per_dept = {}
+    for f in problem['faculty']:
+        per_dept[f['department_id']] = per_dept.get(f['department_id'], 0) + 1
+    eligible = sum(per_dept.get(s['department_id'], 0) for s in problem['subjects'])
+    return len(problem['batches']) * eligible * len(DAYS) * len(HOURS) * len(problem['classrooms'])
+
+
+def build_legacy(problem):
+    # Port of the original single-layer generate_timetable model
+    model = cp_model.CpModel()
+    batches, subjects = problem['batches'], problem['subjects']
+    faculty, classrooms = problem['faculty'], problem['classrooms']
+    timetable_vars = {}
+    for b in batches:
+        for s in subjects:
+            for d in DAYS:
+                for h in HOURS:
+                    for c in classrooms:
+                        for f in faculty:
+                            if f['department_id'] == s['department_id']:
+                                timetable_vars[(b['id'], s['id'], d, h, c['id'], f['id'])] = model.NewBoolVar('')
+    for b in batches:
+        for s in subjects:
+            vars = [timetable_vars[(b['id'], s['id'], d, h, c['id'], f['id'])]
+                    for d in DAYS for h in HOURS for c in classrooms for f in faculty
+                    if (b['id'], s['id'], d, h, c['id'], f['id']) in timetable_vars]
+            model.Add(sum(vars) == s['weekly_classes'])
+    for d in DAYS:
+        for h in HOURS:
+            for c in classrooms:
+                vars = [timetable_vars[(b['id'], s['id'], d, h, c['id'], f['id'])]
+                        for b in batches for s in subjects for f in faculty
+                        if (b['id'], s['id'], d, h, c['id'], f['id']) in timetable_vars]
+                model.Add(sum(vars) <= 1)
+    for f in faculty:
+        vars = [timetable_vars[(b['id'], s['id'], d, h, c['id'], f['id'])]
+                for b in batches for s in subjects for d in DAYS for h in HOURS for c in classrooms
+                if (b['id'], s['id'], d, h, c['id'], f['id']) in timetable_vars]
+        model.Add(sum(vars) <= f['max_load'])
+    for lb in problem['lunchbreaks']:
+        for s in subjects:
+            for c in classrooms:
+                for f in faculty:
+                    key = (lb['batch_id'], s['id'], lb['day'], lb['start_time'], c['id'], f['id'])
+                    if key in timetable_vars:
+                        model.Add(timetable_vars[key] == 0)
+    return model
+
+
+def timed_solve(model):
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = SOLVE_TIME_LIMIT
+    start = time.perf_counter()
+    status = solver.Solve(model)
+    return time.perf_counter() - start, solver.StatusName(status)
+
+
+def run(sizes):
+    print(f'{"size":<22}{"model":<12}{"variables":>12}{"build s":>10}{"solve s":>10}  status')
+    for size in sizes:
+        problem = generate_problem(*size)
+        label = 'x'.join(str(n) for n in size[:4])
+
+        legacy_vars = legacy_variable_count(problem)
+        if legacy_vars <= LEGACY_VAR_LIMIT:
+            start = time.perf_counter()
+            model = build_legacy(problem)
+            build = time.perf_counter() - start
+            solve, status = timed_solve(model)
+            print(f'{label:<22}{"legacy":<12}{legacy_vars:>12}{build:>10.2f}{solve:>10.2f}  {status}')
+        else:
+            print(f'{label:<22}{"legacy":<12}{legacy_vars:>12}{"-":>10}{"-":>10}  skipped (too large)')
+
+        start = time.perf_counter()
+        slots = TimetableModel(problem)
+        build = time.perf_counter() - start
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = SOLVE_TIME_LIMIT
+        start = time.perf_counter()
+        solver, status = slots.solve(solver)
+        solve = time.perf_counter() - start
+        variables = slots.num_variables()
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            start = time.perf_counter()
+            rooms = RoomModel(problem, slots.extract())
+            build += time.perf_counter() - start
+            start = time.perf_counter()
+            rooms.solve()
+            solve += time.perf_counter() - start
+            variables += rooms.num_variables()
+        print(f'{label:<22}{"decomposed":<12}{variables:>12}{build:>10.2f}{solve:>10.2f}  {solver.StatusName(status)}')
+
+        # Build and solve happen inside the department workers, so only wall time is reported
+        start = time.perf_counter()
+        status, _ = solve_partitioned(problem, {'max_time_in_seconds': SOLVE_TIME_LIMIT})
+        wall = time.perf_counter() - start
+        print(f'{label:<22}{"partitioned":<12}{"-":>12}{"-":>10}{wall:>10.2f}  {cp_model.CpSolver().StatusName(status)}')
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else len(SIZES)
+    run(SIZES[:count])
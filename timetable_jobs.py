@@ -0,0 +1,189 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from ortools.sat.python import cp_model
+from sqlalchemy import text
+
+from db_config import create_engine
+from timetable_solver import make_solver, solve_incremental, solve_partitioned, solve_timetable
+
+MAX_WORKERS = int(os.environ.get('TIMETABLE_WORKERS', 2))
+
+_executor = None
+
+
+def get_executor():
+    # Created lazily so the pool is only started by processes that serve requests
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def update_job(engine, job_id, **fields):
+    assignments = ', '.join(f'{name} = :{name}' for name in fields)
+    with engine.begin() as conn:
+        conn.execute(text(f'UPDATE timetable_jobs SET {assignments} WHERE id = :job_id'), dict(fields, job_id=job_id))
+
+
+class ProgressCallback(cp_model.CpSolverSolutionCallback):
+    # Streams every improving solution to the job record as it is found
+    def __init__(self, engine, job_id):
+        super().__init__()
+        self.engine = engine
+        self.job_id = job_id
+        self.solutions = 0
+        self.history = []
+
+    def on_solution_callback(self):
+        self.solutions += 1
+        point = {
+            'objective': self.ObjectiveValue(),
+            'best_bound': self.BestObjectiveBound(),
+            'wall_time': self.WallTime()
+        }
+        self.history.append(point)
+        update_job(self.engine, self.job_id, solutions=self.solutions, progress=json.dumps(self.history), **point)
+
+    def on_partition(self, event):
+        # Department processes cannot reach this callback, so a partitioned
+        # solve reports each finished department and the fallback instead
+        self.history.append(event)
+        if event.get('fallback'):
+            message = 'A department had no timetable of its own, solving all departments together.'
+        else:
+            done = sum(1 for point in self.history if 'department' in point)
+            message = f'{done} of {event["departments"]} departments finished.'
+        update_job(self.engine, self.job_id, progress=json.dumps(self.history), message=message,
+                   wall_time=event['wall_time'])
+
+
+SCHEDULE_COLUMNS = ('batch_id', 'subject_id', 'faculty_id', 'classroom_id', 'day', 'time_slot')
+# Older schedule sets are kept for this many versions before their rows are pruned
+KEEP_VERSIONS = int(os.environ.get('TIMETABLE_KEEP_VERSIONS', 2))
+
+
+def current_version(conn):
+    return conn.execute(text('SELECT id FROM schedule_versions WHERE is_current')).scalar()
+
+
+def load_schedule(conn):
+    # Current schedule set as {row tuple: [schedule ids]}
+    current = {}
+    result = conn.execute(
+        text(f'SELECT id, {", ".join(SCHEDULE_COLUMNS)} FROM schedules WHERE version_id = :version_id'),
+        {'version_id': current_version(conn)}
+    )
+    for row in result:
+        current.setdefault(tuple(row[1:]), []).append(row[0])
+    return current
+
+
+def schedule_diff(current, rows):
+    # Rows added to and schedule ids dropped from the current set
+    remaining = {key: list(ids) for key, ids in current.items()}
+    added = []
+    for row in rows:
+        if remaining.get(row):
+            remaining[row].pop()
+        else:
+            added.append(row)
+    removed = [(key, schedule_id) for key, ids in remaining.items() for schedule_id in ids]
+    return added, removed
+
+
+def write_version(engine, job_id, rows):
+    # The new schedule set is written next to the current one in a single
+    # executemany and only then made current, so readers always see a
+    # complete timetable
+    with engine.begin() as conn:
+        version_id = conn.execute(
+            text('INSERT INTO schedule_versions (job_id, created_at, row_count, is_current) '
+                 'VALUES (:job_id, :created_at, :row_count, false) RETURNING id'),
+            {'job_id': job_id, 'created_at': datetime.now(), 'row_count': len(rows)}
+        ).scalar()
+        if rows:
+            conn.execute(
+                text(f'INSERT INTO schedules (version_id, {", ".join(SCHEDULE_COLUMNS)}) '
+                     f'VALUES (:version_id, {", ".join(":" + name for name in SCHEDULE_COLUMNS)})'),
+                [dict(zip(SCHEDULE_COLUMNS, row), version_id=version_id) for row in rows]
+            )
+    with engine.begin() as conn:
+        conn.execute(text('UPDATE schedule_versions SET is_current = (id = :version_id)'), {'version_id': version_id})
+        conn.execute(
+            text('DELETE FROM schedules WHERE version_id < (SELECT MIN(id) FROM (SELECT id FROM schedule_versions '
+                 'WHERE id <= :version_id ORDER BY id DESC LIMIT :keep) AS kept)'),
+            {'version_id': version_id, 'keep': KEEP_VERSIONS}
+        )
+    return version_id
+
+
+def run_job(job_id, problem, database_uri, mode='full', reopen=None, parameters=None):
+    # mode is 'full', 'incremental' or 'partitioned'; reopen holds the explicitly
+    # re-opened batch_ids, faculty_ids and classroom_ids of an incremental solve
+    # and parameters the solver profile (see timetable_solver.make_solver)
+    engine = create_engine(database_uri)
+    start = time.perf_counter()
+    update_job(engine, job_id, status='running', started_at=datetime.now())
+    try:
+        solver = make_solver(parameters)
+        callback = ProgressCallback(engine, job_id)
+        with engine.connect() as conn:
+            current = load_schedule(conn)
+        if mode == 'incremental':
+            existing = [row for row, ids in current.items() for _ in ids]
+            status, rows, reopened = solve_incremental(problem, existing, solver, callback, **(reopen or {}))
+        elif mode == 'partitioned':
+            status, rows = solve_partitioned(problem, parameters, callback=callback, progress=callback.on_partition)
+            reopened = [b['id'] for b in problem['batches']]
+        else:
+            status, rows = solve_timetable(problem, solver, callback)
+            reopened = [b['id'] for b in problem['batches']]
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            added, removed = schedule_diff(current, rows)
+            version_id = write_version(engine, job_id, rows)
+            diff = {
+                'reopened_batches': sorted(reopened),
+                'added': [dict(zip(SCHEDULE_COLUMNS, row)) for row in added],
+                'removed': [dict(zip(SCHEDULE_COLUMNS, row), id=schedule_id) for row, schedule_id in removed]
+            }
+            # FEASIBLE means the time or gap limit stopped the search: keep the best timetable found
+            note = '' if status == cp_model.OPTIMAL else ' Search stopped at the limit, best timetable found was saved.'
+            update_job(engine, job_id, status='done', diff=json.dumps(diff), solver_status=solver.StatusName(status),
+                       schedule_version_id=version_id,
+                       message=f'{len(rows)} classes scheduled, {len(added)} added, {len(removed)} removed.{note}',
+                       wall_time=time.perf_counter() - start, finished_at=datetime.now())
+        else:
+            update_job(engine, job_id, status='failed', solver_status=solver.StatusName(status),
+                       message='No feasible schedule found with current constraints.',
+                       wall_time=time.perf_counter() - start, finished_at=datetime.now())
+    except Exception as e:
+        update_job(engine, job_id, status='failed', message=str(e), finished_at=datetime.now())
+        raise
+    finally:
+        engine.dispose()
+
+
+def _check_crashed(future, job_id, database_uri):
+    # A worker that died (or never started) cannot report its own failure
+    error = future.exception()
+    if error is None:
+        return
+    engine = create_engine(database_uri)
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE timetable_jobs SET status = 'failed', message = :message, finished_at = :finished_at "
+                 "WHERE id = :job_id AND status IN ('queued', 'running')"),
+            {'message': str(error) or type(error).__name__, 'finished_at': datetime.now(), 'job_id': job_id}
+        )
+    engine.dispose()
+
+
+def submit(job_id, problem, database_uri, mode='full', reopen=None, parameters=None):
+    future = get_executor().submit(run_job, job_id, problem, database_uri, mode, reopen, parameters)
+    future.add_done_callback(lambda f: _check_crashed(f, job_id, database_uri))
+    return future
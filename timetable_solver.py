@@ -0,0 +1,595 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from ortools.graph.python import min_cost_flow
+from ortools.sat.python import cp_model
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
+HOURS = ['9-10am', '10-11am', '11-12pm', '1-2pm', '2-3pm']
+HOUR_STARTS = [9, 10, 11, 13, 14]
+
+# Weights of the soft preferences in the objective. keep rewards every hinted
+# assignment an incremental solve preserves and outweighs the others.
+WEIGHTS = {
+    'gap': 3,
+    'spread': 2,
+    'availability': 5,
+    'undersized_room': 2,
+    'unused_seats': 1,
+    'keep': 100
+}
+
+# Defaults for a solver profile; num_search_workers = 0 lets CP-SAT use every core
+DEFAULT_PARAMETERS = {
+    'max_time_in_seconds': float(os.environ.get('TIMETABLE_TIME_LIMIT', 300)),
+    'num_search_workers': 0,
+    'relative_gap_limit': 0.0,
+    'objective_mode': 'optimize'
+}
+# Incremental repairs keep most rows fixed and should come back in seconds, so
+# unless a profile is chosen they replace the default profile's time limit
+INCREMENTAL_PARAMETERS = {
+    'max_time_in_seconds': float(os.environ.get('TIMETABLE_INCREMENTAL_TIME_LIMIT', 10)),
+}
+
+
+def make_solver(parameters=None):
+    # objective_mode 'feasible' stops at the first timetable, 'optimize' keeps
+    # improving until the time limit or the gap limit is reached
+    parameters = dict(DEFAULT_PARAMETERS, **(parameters or {}))
+    solver = cp_model.CpSolver()
+    if parameters['max_time_in_seconds']:
+        solver.parameters.max_time_in_seconds = parameters['max_time_in_seconds']
+    solver.parameters.num_workers = parameters['num_search_workers']
+    solver.parameters.relative_gap_limit = parameters['relative_gap_limit']
+    solver.parameters.stop_after_first_solution = parameters['objective_mode'] == 'feasible'
+    return solver
+
+
+def parse_availability(text):
+    # Faculty availability is free text such as "Mon, Tue 9-10am, 2-3pm": a day
+    # on its own covers the whole day, an hour on its own covers it every day.
+    # Returns the set of available slots, or None when nothing is recognised.
+    slots = set()
+    for token in (text or '').replace(';', ',').split(','):
+        day = hour = None
+        for word in token.split():
+            if word[:3].title() in DAYS:
+                day = DAYS.index(word[:3].title())
+            elif word in HOURS:
+                hour = HOURS.index(word)
+        if day is None and hour is None:
+            continue
+        for d in ([day] if day is not None else range(len(DAYS))):
+            for h in ([hour] if hour is not None else range(len(HOURS))):
+                slots.add(d * len(HOURS) + h)
+    return slots or None
+
+
+def slot_index(day, time_slot):
+    # Lunch breaks are entered as HH:MM from the form, schedules use the hour labels
+    if day not in DAYS:
+        return None
+    if time_slot in HOURS:
+        hour = HOURS.index(time_slot)
+    else:
+        try:
+            hour = HOUR_STARTS.index(int(str(time_slot).split(':')[0]))
+        except ValueError:
+            return None
+    return DAYS.index(day) * len(HOURS) + hour
+
+
+class TimetableModel:
+    # Decomposed model: instead of one boolean per (batch, subject, day, hour,
+    # classroom, faculty) the problem is split into a slot layer (batch, subject,
+    # slot) and a faculty layer (batch, subject, faculty). Rooms are
+    # interchangeable under the hard constraints, so the slot layer only caps the
+    # classes per slot at the number of rooms and RoomModel picks the rooms.
+    #
+    # Variables are kept in dense NumPy arrays of variable indices (-1 where no
+    # variable exists): x is (batches, subjects, slots) and y is (batches,
+    # subjects, eligible faculty), with y_faculty mapping the last axis of y to
+    # positions in problem['faculty']. Each constraint group is emitted in one
+    # pass over slices of these arrays.
+    #
+    # fixed_rows are schedule rows that stay as they are: they only use up rooms
+    # and faculty load. hint_rows seed the search with a previous schedule.
+
+    def __init__(self, problem, fixed_rows=(), hint_rows=()):
+        self.problem = problem
+        self.fixed_rows = fixed_rows
+        self.hint_rows = hint_rows
+        self.model = cp_model.CpModel()
+        self.slots = [(d, h) for d in DAYS for h in HOURS]
+        self.batch_ids = np.array([b['id'] for b in problem['batches']], dtype=np.int64)
+        self.subject_ids = np.array([s['id'] for s in problem['subjects']], dtype=np.int64)
+        self.faculty_ids = np.array([f['id'] for f in problem['faculty']], dtype=np.int64)
+        self.batch_index = {b_id: i for i, b_id in enumerate(self.batch_ids.tolist())}
+        self.subject_index = {s_id: j for j, s_id in enumerate(self.subject_ids.tolist())}
+        self.faculty_index = {f_id: k for k, f_id in enumerate(self.faculty_ids.tolist())}
+        self.vars = []
+        self.solution = None
+        self.infeasible = False
+        self._build()
+
+    def _new_bool_vars(self, mask, prefix):
+        # One BoolVar per True cell of mask, returned as an index array shaped like mask
+        index = np.full(mask.shape, -1, dtype=np.int64)
+        start = len(self.vars)
+        count = int(np.count_nonzero(mask))
+        self.vars.extend(self.model.NewBoolVar(f'{prefix}{n}') for n in range(start, start + count))
+        index[mask] = np.arange(start, start + count)
+        return index
+
+    def _sum(self, index):
+        return cp_model.LinearExpr.Sum([self.vars[n] for n in index[index >= 0].tolist()])
+
+    def _build(self):
+        model = self.model
+        num_batches, num_subjects, num_slots = len(self.batch_ids), len(self.subject_ids), len(self.slots)
+        weekly = np.array([s['weekly_classes'] for s in self.problem['subjects']], dtype=np.int64)
+
+        open_slots = np.ones((num_batches, num_slots), dtype=bool)
+        for lb in self.problem['lunchbreaks']:
+            t = slot_index(lb['day'], lb['start_time'])
+            if t is not None and lb['batch_id'] in self.batch_index:
+                open_slots[self.batch_index[lb['batch_id']], t] = False
+
+        # Slot layer: each subject must meet weekly_classes times per batch
+        self.x = self._new_bool_vars(
+            np.broadcast_to(open_slots[:, None, :], (num_batches, num_subjects, num_slots)), 'x')
+        for row, count in zip(self.x.reshape(-1, num_slots), np.tile(weekly, num_batches).tolist()):
+            model.Add(self._sum(row) == count)
+
+        # Prevent double-booking of classrooms
+        used_rooms = np.zeros(num_slots, dtype=np.int64)
+        fixed_load = np.zeros(len(self.faculty_ids), dtype=np.int64)
+        for (b_id, s_id, f_id, c_id, day, hour) in self.fixed_rows:
+            used_rooms[slot_index(day, hour)] += 1
+            if f_id in self.faculty_index:
+                fixed_load[self.faculty_index[f_id]] += 1
+        # A partitioned solve hands each department its own per-slot room quota
+        capacity = np.array(self.problem.get('slot_capacity') or [len(self.problem['classrooms'])] * num_slots)
+        for t, limit in enumerate((capacity - used_rooms).tolist()):
+            model.Add(self._sum(self.x[:, :, t]) <= limit)
+
+        # Faculty layer: one teacher per batch/subject from the subject's department
+        eligible = {}
+        for k, f in enumerate(self.problem['faculty']):
+            eligible.setdefault(f['department_id'], []).append(k)
+        width = max([len(eligible.get(s['department_id'], [])) for s in self.problem['subjects']] + [0])
+        self.y_faculty = np.full((num_subjects, width), -1, dtype=np.int64)
+        for j, s in enumerate(self.problem['subjects']):
+            positions = eligible.get(s['department_id'], [])
+            self.y_faculty[j, :len(positions)] = positions
+        self.y = self._new_bool_vars(
+            np.broadcast_to(self.y_faculty[None] >= 0, (num_batches, num_subjects, width)), 'y')
+        # Only subjects that meet at all need a teacher
+        rows = self.y.reshape(num_batches * num_subjects, width)
+        for row, needed in zip(rows, np.tile(weekly > 0, num_batches).tolist()):
+            if not needed:
+                continue
+            choices = row[row >= 0].tolist()
+            if not choices:
+                # A subject that meets has no eligible teacher
+                self.infeasible = True
+                break
+            model.AddExactlyOne([self.vars[n] for n in choices])
+
+        # Faculty max load: group the faculty layer by teacher in one sort
+        index = self.y.ravel()
+        teacher = np.broadcast_to(self.y_faculty[None], self.y.shape).ravel()
+        weight = np.broadcast_to(weekly[None, :, None], self.y.shape).ravel()
+        present = index >= 0
+        index, teacher, weight = index[present], teacher[present], weight[present]
+        order = np.argsort(teacher, kind='stable')
+        teachers, starts = np.unique(teacher[order], return_index=True)
+        for k, group in zip(teachers.tolist(), np.split(order, starts[1:])):
+            expr = cp_model.LinearExpr.WeightedSum([self.vars[n] for n in index[group].tolist()],
+                                                   weight[group].tolist())
+            model.Add(expr <= self.problem['faculty'][k]['max_load'] - int(fixed_load[k]))
+
+        penalties = self._soft_constraints(open_slots, weekly)
+
+        # Keep as much of the hinted schedule as possible
+        kept = set()
+        for (b_id, s_id, f_id, c_id, day, hour) in self.hint_rows:
+            i, j = self.batch_index.get(b_id), self.subject_index.get(s_id)
+            t = slot_index(day, hour)
+            if i is None or j is None or t is None:
+                continue
+            if self.x[i, j, t] >= 0:
+                kept.add(int(self.x[i, j, t]))
+            k = np.nonzero(self.y_faculty[j] == self.faculty_index.get(f_id, -2))[0]
+            if len(k):
+                kept.add(int(self.y[i, j, k[0]]))
+        for n in sorted(kept):
+            model.AddHint(self.vars[n], 1)
+            penalties.append((n, -WEIGHTS['keep']))
+        self.objective = penalties
+        if penalties:
+            terms, weights = zip(*penalties)
+            model.Minimize(cp_model.LinearExpr.WeightedSum([self.vars[n] for n in terms], weights))
+
+    def _new_bool_var(self, name):
+        self.vars.append(self.model.NewBoolVar(name))
+        return len(self.vars) - 1
+
+    def _new_int_var(self, lb, ub, name):
+        self.vars.append(self.model.NewIntVar(lb, ub, name))
+        return len(self.vars) - 1
+
+    def _soft_constraints(self, open_slots, weekly):
+        # Returns (variable index, weight) objective terms for the soft preferences
+        model = self.model
+        num_batches, num_subjects, num_slots = self.x.shape
+        penalties = []
+
+        # Gaps in a batch's day: occupied marks slots where the batch has any
+        # class, starts marks the first slot of each run of classes, and every
+        # run after the first in a day costs a gap. Lunch-blocked slots are
+        # skipped so classes around lunch count as one run.
+        occupied = self._new_bool_vars(open_slots, 'o')
+        for i, t in zip(*np.nonzero(open_slots)):
+            classes = self._sum(self.x[i, :, t])
+            model.Add(num_subjects * self.vars[occupied[i, t]] >= classes)
+            model.Add(self.vars[occupied[i, t]] <= classes)
+        starts = self._new_bool_vars(open_slots, 'g')
+        for i in range(num_batches):
+            for d in range(len(DAYS)):
+                day = [t for t in range(d * len(HOURS), (d + 1) * len(HOURS)) if open_slots[i, t]]
+                if len(day) < 3:
+                    continue
+                previous = None
+                for t in day:
+                    if previous is None:
+                        model.Add(self.vars[starts[i, t]] >= self.vars[occupied[i, t]])
+                    else:
+                        model.Add(self.vars[starts[i, t]] >= self.vars[occupied[i, t]] - self.vars[occupied[i, previous]])
+                    previous = t
+                gaps = self._new_int_var(0, len(HOURS), f'gap{len(self.vars)}')
+                model.Add(self.vars[gaps] >= self._sum(starts[i, day]) - 1)
+                penalties.append((gaps, WEIGHTS['gap']))
+
+        # Spread each subject's weekly classes over different days
+        for j in np.nonzero(weekly > 1)[0].tolist():
+            for i in range(num_batches):
+                for d in range(len(DAYS)):
+                    day = self.x[i, j, d * len(HOURS):(d + 1) * len(HOURS)]
+                    if np.count_nonzero(day >= 0) < 2:
+                        continue
+                    excess = self._new_int_var(0, len(HOURS), f'e{len(self.vars)}')
+                    model.Add(self.vars[excess] >= self._sum(day) - 1)
+                    penalties.append((excess, WEIGHTS['spread']))
+
+        # Faculty availability: penalise a class in a slot the chosen teacher marked unavailable
+        unavailable = np.zeros((len(self.faculty_ids), num_slots), dtype=bool)
+        for k, f in enumerate(self.problem['faculty']):
+            available = parse_availability(f.get('availability'))
+            if available is not None:
+                unavailable[k] = True
+                unavailable[k, sorted(available)] = False
+        for j in range(num_subjects):
+            eligible = self.y_faculty[j][self.y_faculty[j] >= 0]
+            for t in np.nonzero(unavailable[eligible].any(axis=0))[0].tolist():
+                columns = np.nonzero(unavailable[eligible, t])[0]
+                for i in np.nonzero(self.x[:, j, t] >= 0)[0].tolist():
+                    clash = self._new_bool_var(f'a{len(self.vars)}')
+                    model.Add(self.vars[clash] >= self.vars[self.x[i, j, t]] + self._sum(self.y[i, j, columns]) - 1)
+                    penalties.append((clash, WEIGHTS['availability']))
+        return penalties
+
+    def num_variables(self):
+        return len(self.model.Proto().variables)
+
+    def solve(self, solver=None, callback=None):
+        solver = solver or cp_model.CpSolver()
+        if self.infeasible:
+            return solver, cp_model.INFEASIBLE
+        if not self.objective or solver.parameters.stop_after_first_solution:
+            status = solver.Solve(self.model, callback)
+            if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                self.solution = self.values(solver)
+            return solver, status
+
+        # Anytime loop: find any timetable without the objective first, then
+        # improve on it with the remaining time. If no better timetable turns
+        # up, the first one is kept.
+        model = self.model
+        time_limit = solver.parameters.max_time_in_seconds
+        model.ClearObjective()
+        solver.parameters.stop_after_first_solution = True
+        status = solver.Solve(model)
+        solver.parameters.stop_after_first_solution = False
+        terms, weights = zip(*self.objective)
+        model.Minimize(cp_model.LinearExpr.WeightedSum([self.vars[n] for n in terms], weights))
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return solver, status
+        self.solution = self.values(solver)
+        remaining = time_limit - solver.WallTime()
+        if remaining <= 0:
+            return solver, cp_model.FEASIBLE
+        model.ClearHints()
+        for var, value in zip(self.vars, self.solution.tolist()):
+            model.AddHint(var, value)
+        solver.parameters.max_time_in_seconds = remaining
+        status = solver.Solve(model, callback)
+        solver.parameters.max_time_in_seconds = time_limit
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            self.solution = self.values(solver)
+            return solver, status
+        return solver, cp_model.FEASIBLE
+
+    def values(self, solver):
+        # self.vars is in proto order, so the response's solution array lines
+        # up with it and no per-variable solver.Value call is needed
+        return np.array(solver.ResponseProto().solution, dtype=np.int64)[:len(self.vars)]
+
+    def extract(self, solver=None):
+        # Returns (batch_id, subject_id, faculty_id, slot) for every scheduled class
+        if not self.vars or not self.y.size:
+            return []
+        values = self.solution
+        chosen = (self.y >= 0) & (values[self.y] == 1)
+        teacher = self.faculty_ids[self.y_faculty[np.arange(len(self.subject_ids))[None, :], chosen.argmax(axis=2)]]
+        i, j, t = np.nonzero((self.x >= 0) & (values[self.x] == 1))
+        return list(zip(self.batch_ids[i].tolist(), self.subject_ids[j].tolist(),
+                        teacher[i, j].tolist(), t.tolist()))
+
+
+class RoomModel:
+    # Room layer: given the classes placed by TimetableModel, choose a room for
+    # each one so that no room is used twice in the same slot. Rooms taken by
+    # fixed_rows are left out and hint_rows keep classes in the rooms they had
+    # before. The cost matches room capacity to the batch size. This is a
+    # min-cost assignment, solved exactly as a flow of one unit per class from
+    # the class to a (slot, room) node.
+
+    def __init__(self, problem, classes, fixed_rows=(), hint_rows=()):
+        self.problem = problem
+        self.classes = classes
+        self.fixed_rows = fixed_rows
+        self.hint_rows = hint_rows
+        self.rooms = [c['id'] for c in problem['classrooms']]
+        self.assignment = {}
+        self._build()
+
+    def _build(self):
+        students = {b['id']: b['students'] for b in self.problem['batches']}
+        capacity = {c['id']: c['capacity'] for c in self.problem['classrooms']}
+        taken = {(slot_index(day, hour), c_id) for (_, _, _, c_id, day, hour) in self.fixed_rows}
+        previous = {(b_id, s_id, slot_index(day, hour)): c_id
+                    for (b_id, s_id, _, c_id, day, hour) in self.hint_rows}
+        # Nodes: 0 is the source, 1..n the classes, then one node per used
+        # (slot, room) pair, and the sink last
+        room_nodes = {}
+        self.arcs = []
+        for i, (b_id, s_id, f_id, t) in enumerate(self.classes):
+            for c_id in self.rooms:
+                if (t, c_id) in taken:
+                    continue
+                node = room_nodes.setdefault((t, c_id), len(self.classes) + 1 + len(room_nodes))
+                # Missing seats cost more than empty ones; costs are shifted by
+                # the keep bonus so they stay non-negative
+                seats = capacity[c_id] - students.get(b_id, 0)
+                cost = WEIGHTS['undersized_room'] * -seats if seats < 0 else WEIGHTS['unused_seats'] * (seats // 10)
+                if previous.get((b_id, s_id, t)) != c_id:
+                    cost += WEIGHTS['keep']
+                self.arcs.append((i + 1, node, cost, c_id))
+        self.room_nodes = room_nodes
+        self.sink = len(self.classes) + 1 + len(room_nodes)
+
+    def num_variables(self):
+        return len(self.arcs)
+
+    def solve(self):
+        if not self.classes:
+            return cp_model.OPTIMAL
+        flow = min_cost_flow.SimpleMinCostFlow()
+        num_classes = len(self.classes)
+        room_nodes = list(self.room_nodes.values())
+        tails = [0] * num_classes + [tail for tail, _, _, _ in self.arcs] + room_nodes
+        heads = list(range(1, num_classes + 1)) + [head for _, head, _, _ in self.arcs] + [self.sink] * len(room_nodes)
+        costs = [0] * num_classes + [cost for _, _, cost, _ in self.arcs] + [0] * len(room_nodes)
+        arcs = flow.add_arcs_with_capacity_and_unit_cost(
+            np.array(tails), np.array(heads), np.ones(len(tails), dtype=np.int64), np.array(costs))
+        flow.set_node_supply(0, num_classes)
+        flow.set_node_supply(self.sink, -num_classes)
+        if flow.solve() != flow.OPTIMAL:
+            return cp_model.INFEASIBLE
+        flows = flow.flows(arcs[num_classes:num_classes + len(self.arcs)])
+        for (tail, _, _, c_id), used in zip(self.arcs, flows.tolist()):
+            if used:
+                self.assignment[tail - 1] = c_id
+        return cp_model.OPTIMAL
+
+    def extract(self):
+        rows = []
+        for i, (b_id, s_id, f_id, t) in enumerate(self.classes):
+            day, hour = DAYS[t // len(HOURS)], HOURS[t % len(HOURS)]
+            rows.append((b_id, s_id, f_id, self.assignment[i], day, hour))
+        return rows
+
+
+def solve_timetable(problem, solver=None, callback=None, fixed_rows=(), hint_rows=()):
+    # Returns (status, rows) where rows are
+    # (batch_id, subject_id, faculty_id, classroom_id, day, time_slot) tuples
+    slots = TimetableModel(problem, fixed_rows, hint_rows)
+    solver, status = slots.solve(solver, callback)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return status, []
+    rooms = RoomModel(problem, slots.extract(), fixed_rows, hint_rows)
+    room_status = rooms.solve()
+    if room_status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return room_status, []
+    return status, rooms.extract()
+
+
+def affected_batches(problem, rows, batch_ids=(), faculty_ids=(), classroom_ids=()):
+    # Batches whose current schedule rows no longer satisfy the problem, plus
+    # the batches that use any explicitly re-opened faculty or classroom
+    affected = set(batch_ids)
+    subjects = {s['id']: s for s in problem['subjects']}
+    faculty = {f['id']: f for f in problem['faculty']}
+    classrooms = {c['id'] for c in problem['classrooms']}
+    blocked = {(lb['batch_id'], slot_index(lb['day'], lb['start_time'])) for lb in problem['lunchbreaks']}
+    counts = {}
+    load = {}
+    teachers = {}
+    room_use = {}
+    for (b_id, s_id, f_id, c_id, day, hour) in rows:
+        t = slot_index(day, hour)
+        counts[(b_id, s_id)] = counts.get((b_id, s_id), 0) + 1
+        load[f_id] = load.get(f_id, 0) + 1
+        teachers.setdefault(f_id, set()).add(b_id)
+        room_use.setdefault((t, c_id), set()).add(b_id)
+        if (s_id not in subjects or f_id not in faculty or c_id not in classrooms or t is None
+                or (b_id, t) in blocked or faculty[f_id]['department_id'] != subjects[s_id]['department_id']
+                or f_id in faculty_ids or c_id in classroom_ids):
+            affected.add(b_id)
+    for b in problem['batches']:
+        for s in problem['subjects']:
+            if counts.get((b['id'], s['id']), 0) != s['weekly_classes']:
+                affected.add(b['id'])
+    for f_id, taught in load.items():
+        if f_id in faculty and taught > faculty[f_id]['max_load']:
+            affected |= teachers[f_id]
+    for users in room_use.values():
+        if len(users) > 1:
+            affected |= users
+    return affected & {b['id'] for b in problem['batches']}
+
+
+def solve_incremental(problem, rows, solver=None, callback=None, batch_ids=(), faculty_ids=(), classroom_ids=()):
+    # Re-solves only the affected batches, keeping every other row fixed and
+    # seeding the search with the current schedule. Falls back to a hinted
+    # full solve when the fixed rows leave no room for a solution.
+    # Returns (status, rows, reopened batch ids).
+    reopened = affected_batches(problem, rows, batch_ids, faculty_ids, classroom_ids)
+    current = {b['id'] for b in problem['batches']}
+    fixed = [row for row in rows if row[0] in current and row[0] not in reopened]
+    hints = [row for row in rows if row[0] in reopened]
+    if not reopened:
+        return cp_model.OPTIMAL, fixed, reopened
+    partial = dict(problem, batches=[b for b in problem['batches'] if b['id'] in reopened])
+    status, solved = solve_timetable(partial, solver, callback, fixed, hints)
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return status, fixed + solved, reopened
+    status, solved = solve_timetable(problem, solver, callback, hint_rows=rows)
+    return status, solved, current
+
+
+def split_by_department(problem):
+    # Faculty only teach subjects of their own department, so each department's
+    # subjects and faculty form an independent subproblem sharing the batches
+    # and competing only for classrooms
+    parts = {}
+    for s in problem['subjects']:
+        parts.setdefault(s['department_id'], dict(problem, subjects=[], faculty=[]))['subjects'].append(s)
+    for f in problem['faculty']:
+        if f['department_id'] in parts:
+            parts[f['department_id']]['faculty'].append(f)
+    return parts
+
+
+def room_quotas(problem, parts):
+    # Coordination model: split the rooms of every slot between departments so
+    # each department has enough room-slots for its weekly classes, favouring a
+    # split proportional to demand. Returns {department_id: [quota per slot]}
+    # or None when the rooms cannot cover the demand.
+    num_slots = len(DAYS) * len(HOURS)
+    num_rooms = len(problem['classrooms'])
+    blocked = {}
+    for lb in problem['lunchbreaks']:
+        t = slot_index(lb['day'], lb['start_time'])
+        if t is not None:
+            blocked.setdefault(t, set()).add(lb['batch_id'])
+    demand = {d: len(part['batches']) * sum(s['weekly_classes'] for s in part['subjects'])
+              for d, part in parts.items()}
+    total = sum(demand.values()) or 1
+    model = cp_model.CpModel()
+    quota = {}
+    shortfall = []
+    for d, part in parts.items():
+        for t in range(num_slots):
+            open_batches = len(part['batches']) - len(blocked.get(t, ()))
+            candidates = max(0, open_batches) * len(part['subjects'])
+            quota[(d, t)] = model.NewIntVar(0, min(num_rooms, candidates), f'q_d{d}_t{t}')
+            share = num_rooms * demand[d] // total
+            short = model.NewIntVar(0, share, f'short_d{d}_t{t}')
+            model.Add(short >= share - quota[(d, t)])
+            shortfall.append(short)
+        model.Add(sum(quota[(d, t)] for t in range(num_slots)) >= demand[d])
+    for t in range(num_slots):
+        model.Add(sum(quota[(d, t)] for d in parts) <= num_rooms)
+    model.Maximize(len(shortfall) * num_rooms * sum(quota.values()) - sum(shortfall))
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 10.0
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None
+    return {d: [solver.Value(quota[(d, t)]) for t in range(num_slots)] for d in parts}
+
+
+def solve_department(problem, parameters=None):
+    # Runs in a worker process; returns (status, classes) for one department
+    solver = make_solver(parameters)
+    slots = TimetableModel(problem)
+    solver, status = slots.solve(solver)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return int(status), []
+    return int(status), slots.extract()
+
+
+def solve_partitioned(problem, parameters=None, max_workers=None, callback=None, progress=None):
+    # Solves every department in its own process, then settles classrooms for
+    # the merged classes with one RoomModel. Falls back to the monolithic model
+    # when the room split leaves a department without a solution. callback
+    # streams the monolithic solves; progress(event) gets a dict as each
+    # department finishes and when the fallback starts.
+    parameters = dict(DEFAULT_PARAMETERS, **(parameters or {}))
+    solver = make_solver(parameters)
+    parts = split_by_department(problem)
+    if len(parts) < 2:
+        return solve_timetable(problem, solver, callback)
+    quotas = room_quotas(problem, parts)
+    if quotas is None:
+        return cp_model.INFEASIBLE, []
+    cpus = os.cpu_count() or 1
+    workers = max_workers or min(len(parts), cpus)
+    # The profile's search workers (0 = every core) are shared between the
+    # department processes running at once instead of given to each of them
+    department_parameters = dict(parameters,
+                                 num_search_workers=max(1, (parameters['num_search_workers'] or cpus) // workers))
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(solve_department, dict(part, slot_capacity=quotas[d]), department_parameters): d
+                   for d, part in parts.items()}
+        for future in as_completed(futures):
+            department = futures[future]
+            status, classes = results[department] = future.result()
+            if progress:
+                progress({'department': department, 'departments': len(parts), 'status': cp_model.CpSolverStatus(status).name,
+                          'classes': len(classes), 'wall_time': time.perf_counter() - start})
+    results = [results[d] for d in parts]
+    if any(status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) for status, _ in results):
+        # The fallback only gets what is left of the time limit
+        if parameters['max_time_in_seconds']:
+            remaining = parameters['max_time_in_seconds'] - (time.perf_counter() - start)
+            if remaining <= 0:
+                return cp_model.UNKNOWN, []
+            solver.parameters.max_time_in_seconds = remaining
+        if progress:
+            progress({'fallback': True, 'wall_time': time.perf_counter() - start})
+        return solve_timetable(problem, solver, callback)
+    classes = [c for _, department_classes in results for c in department_classes]
+    rooms = RoomModel(problem, classes)
+    room_status = rooms.solve()
+    if room_status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return room_status, []
+    status = cp_model.OPTIMAL if all(status == cp_model.OPTIMAL for status, _ in results) else cp_model.FEASIBLE
+    return status, rooms.extract()
@@ -0,0 +1,286 @@
+import hashlib
+import os
+import pickle
+import re
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import excel_ingest
+
+CACHE_MAX_BYTES = int(os.environ.get('WORKBOOK_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+DISK_MAX_BYTES = int(os.environ.get('WORKBOOK_DISK_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+# Bumped whenever WorkbookIndex changes shape, so older spilled indexes are not loaded
+INDEX_VERSION = 2
+FUZZY_THRESHOLD = float(os.environ.get('FUZZY_THRESHOLD', 0.8))
+# Dropped from the end of a name before fuzzy matching
+LEGAL_SUFFIXES = {'ltd', 'limited', 'inc', 'incorporated', 'llc', 'llp', 'plc', 'corp', 'corporation', 'co',
+                  'company', 'pvt', 'private', 'pte', 'pty', 'gmbh', 'ag', 'sa', 'bv', 'nv'}
+
+# Every column except these may hold a company name
+EXCLUDED_COLUMNS = ['District', 'Sector']
+# Matrix column for rows with a blank sector, so CSV and Excel headers are never empty
+NO_SECTOR = '(no sector)'
+
+
+def workbook_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_name(company_name):
+    return company_name.strip().lower()
+
+
+def canonical_name(company_name):
+    # Lowercase words without punctuation or trailing legal suffixes, so
+    # 'Tata Motors Ltd.' and 'TATA MOTORS LIMITED' are both 'tata motors'
+    text = re.sub(r"[.'’]", '', company_name.lower())
+    words = re.sub(r'[\W_]+', ' ', text).split()
+    if words and words[0] == 'the' and len(words) > 1:
+        words = words[1:]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def sheet_sectors(df):
+    if 'Sector' in df.columns:
+        return df['Sector'].astype(str).to_numpy(dtype=object)
+    return np.full(len(df), '', dtype=object)
+
+
+class TrigramIndex:
+    # Trigrams of each name's canonical form, mapped to the sorted ids of
+    # the names containing them. A search only reads the postings of the
+    # query's trigrams: a name reaching Dice similarity t shares at least
+    # t * |q| / (2 - t) of the query's |q| trigrams, so it must hold one of
+    # the |q| - that + 1 rarest, and only those postings give candidates.
+    # Shared counts for the candidates come from binary searches in the
+    # remaining postings.
+
+    def __init__(self, names):
+        self.names = list(names)
+        grams = [trigrams(canonical_name(name)) for name in self.names]
+        self.sizes = np.array([len(name_grams) for name_grams in grams], dtype=np.int32)
+        postings = {}
+        for name_id, name_grams in enumerate(grams):
+            for gram in name_grams:
+                postings.setdefault(gram, []).append(name_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.nbytes = (sum(ids.nbytes + sys.getsizeof(gram) + 64 for gram, ids in self.postings.items())
+                       + self.sizes.nbytes)
+
+    def search(self, company_name, threshold=FUZZY_THRESHOLD):
+        # [(name, score)] of names scoring at least threshold, best first
+        query = trigrams(canonical_name(company_name))
+        lists = sorted((self.postings.get(gram, np.array([], dtype=np.int32)) for gram in query), key=len)
+        required = int(np.ceil(threshold * len(query) / (2 - threshold) - 1e-9))
+        candidates = np.unique(np.concatenate(lists[:len(lists) - required + 1]))
+        if not len(candidates):
+            return []
+        shared = np.zeros(len(candidates), dtype=np.int32)
+        for ids in lists:
+            if len(ids):
+                found = np.searchsorted(ids, candidates).clip(max=len(ids) - 1)
+                shared += ids[found] == candidates
+        scores = 2 * shared / (len(query) + self.sizes[candidates])
+        keep = np.flatnonzero(scores >= threshold)
+        keep = keep[np.argsort(-scores[keep], kind='stable')]
+        return [(self.names[candidates[i]], float(scores[i])) for i in keep]
+
+
+class WorkbookIndex:
+    # Inverted index of one workbook: each normalized company name maps to
+    # the (sheet, row, sector) postings of the rows it appears in, one posting
+    # per row however many of its cells hold the name. Postings are stored as
+    # columns grouped by name and offsets holds each name's slice, so a search
+    # is a dict lookup and a bincount over the sector codes. Fuzzy searches
+    # first find similar names in a TrigramIndex over the distinct names.
+
+    def __init__(self, name, sheets):
+        self.name = name
+        self.sheet_names = [sheet_name for sheet_name, _ in sheets]
+        self.row_count = sum(len(df) for _, df in sheets)
+        # Postings are built on integer codes. Cells are factorized first so
+        # only distinct values are normalized, then each cell becomes
+        # name code * total rows + workbook row: sorting those keys groups the
+        # postings by name and repeats within a row sit next to each other.
+        first_rows = np.cumsum([0] + [len(df) for _, df in sheets])
+        cells, cell_rows = [np.array([], dtype=object)], [np.array([], dtype=np.int64)]
+        for first, (_, df) in zip(first_rows, sheets):
+            company_columns = [col for col in df.columns if col not in EXCLUDED_COLUMNS]
+            cells.extend(df[col].astype(str).to_numpy(dtype=object) for col in company_columns)
+            cell_rows.extend(np.arange(first, first + len(df), dtype=np.int64) for _ in company_columns)
+        cell_codes, values = pd.factorize(np.concatenate(cells))
+        value_names = pd.Series(values, dtype=object).str.strip().str.lower().to_numpy(dtype=object)
+        name_of_value, names = pd.factorize(value_names)
+        filled = value_names[cell_codes] != ''
+        total = max(self.row_count, 1)
+        keys = np.sort(name_of_value[cell_codes[filled]].astype(np.int64) * total + np.concatenate(cell_rows)[filled])
+        keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+        posting_names = keys // total
+        posting_rows = keys % total
+        row_sectors, sectors = pd.factorize(np.concatenate([sheet_sectors(df) for _, df in sheets])
+                                            if sheets else np.array([], dtype=object))
+        self.sectors = [str(sector) for sector in sectors]
+        self.sheet_ids = (np.searchsorted(first_rows, posting_rows, side='right') - 1).astype(np.int32)
+        self.rows = (posting_rows - first_rows[self.sheet_ids]).astype(np.int32)
+        self.sector_codes = row_sectors[posting_rows].astype(np.int32)
+        starts = np.flatnonzero(np.diff(posting_names, prepend=-1))
+        stops = np.r_[starts[1:], len(keys)]
+        self.offsets = {names[posting_names[start]]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
+        self.trigrams = TrigramIndex(self.offsets)
+        self.nbytes = (self.sheet_ids.nbytes + self.rows.nbytes + self.sector_codes.nbytes
+                       + sys.getsizeof(self.offsets)
+                       + sum(sys.getsizeof(name) + 64 for name in self.offsets)
+                       + sum(sys.getsizeof(sector) for sector in self.sectors)
+                       + self.trigrams.nbytes)
+
+    def similar_names(self, company_name, threshold=FUZZY_THRESHOLD):
+        return self.trigrams.search(company_name, threshold)
+
+    def positions(self, company_name, threshold=None):
+        # Posting positions of the rows matching company_name: exactly after
+        # strip().lower(), or every name scoring threshold or more
+        if threshold is None:
+            start, stop = self.offsets.get(normalize_name(company_name), (0, 0))
+            return np.arange(start, stop)
+        spans = [self.offsets[name] for name, _ in self.similar_names(company_name, threshold)]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in spans] + [np.array([], dtype=np.int64)])
+        # A row holding two of the matched spellings counts once
+        rows = self.sheet_ids[positions].astype(np.int64) * max(self.row_count, 1) + self.rows[positions]
+        _, first = np.unique(rows, return_index=True)
+        return positions[np.sort(first)]
+
+    def count(self, company_name, threshold=None):
+        # (rows matched, {sector: rows}) across every sheet
+        if threshold is None:
+            start, stop = self.offsets.get(normalize_name(company_name), (0, 0))
+            codes = self.sector_codes[start:stop]
+        else:
+            codes = self.sector_codes[self.positions(company_name, threshold)]
+        counts = np.bincount(codes)
+        return len(codes), {self.sectors[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def count_matrix(self, company_names, threshold=None):
+        # Company x sector DataFrame of row counts with a leading Total column.
+        # Each name is a hash lookup into offsets (or a trigram search when
+        # threshold is set) and all their postings are counted in one
+        # bincount; names that normalize alike are listed once under their
+        # first spelling.
+        labels = {}
+        for company_name in company_names:
+            if normalize_name(company_name):
+                labels.setdefault(normalize_name(company_name), company_name.strip())
+        positions = [self.positions(key, threshold) for key in labels]
+        totals = np.array([len(p) for p in positions], dtype=np.int64)
+        codes = self.sector_codes[np.concatenate(positions + [np.array([], dtype=np.int64)])]
+        width = len(self.sectors)
+        cells = np.repeat(np.arange(len(positions)), totals) * width + codes
+        counts = np.bincount(cells, minlength=len(positions) * width).reshape(len(positions), width)
+        order = sorted(np.flatnonzero(counts.sum(axis=0)), key=lambda code: self.sectors[code])
+        matrix = pd.DataFrame(counts[:, order], columns=[self.sectors[code] or NO_SECTOR for code in order],
+                              index=pd.Index(list(labels.values()), name='Company'))
+        matrix.insert(0, 'Total', totals, allow_duplicates=True)
+        return matrix
+
+    def postings(self, company_name):
+        # [(sheet name, row, sector)] with rows numbered from 0 below the header
+        start, stop = self.offsets.get(normalize_name(company_name), (0, 0))
+        return [(self.sheet_names[sheet_id], int(row), self.sectors[code]) for sheet_id, row, code in
+                zip(self.sheet_ids[start:stop], self.rows[start:stop], self.sector_codes[start:stop])]
+
+
+class WorkbookCache:
+    # LRU of WorkbookIndex objects keyed by the workbook's content hash. Once
+    # the indexes in memory pass max_bytes the least recently used ones are
+    # pickled to directory and dropped; a later get loads them back. The
+    # directory itself is trimmed by mtime once it grows past disk_max_bytes.
+    # Workbooks are parsed through excel_ingest, skipping the unused District
+    # column; with a ColumnarCache the parsed sheets are kept for rebuilding
+    # an index that has been trimmed.
+
+    def __init__(self, directory, max_bytes=CACHE_MAX_BYTES, disk_max_bytes=DISK_MAX_BYTES, sheets=None):
+        self.directory = directory
+        self.sheets = sheets
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.{INDEX_VERSION}.pickle')
+
+    def get(self, key):
+        # None for unknown keys and for anything that is not a content hash
+        if not key or not KEY_PATTERN.fullmatch(key):
+            return None
+        with self.lock:
+            index = self.entries.get(key)
+            if index is not None:
+                self.entries.move_to_end(key)
+                return index
+            try:
+                with open(self.path(key), 'rb') as f:
+                    index = pickle.load(f)
+            except FileNotFoundError:
+                return None
+            self._add(key, index)
+        return index
+
+    def put(self, key, index):
+        with self.lock:
+            if key not in self.entries:
+                self._add(key, index)
+        return index
+
+    def _add(self, key, index):
+        self.entries[key] = index
+        self.size += index.nbytes
+        # The newest index stays in memory even if it is larger than the cap
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            old_key, old = self.entries.popitem(last=False)
+            self.size -= old.nbytes
+            self._spill(old_key, old)
+
+    def _spill(self, key, index):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._trim()
+
+    def _trim(self):
+        files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                 for entry in os.scandir(self.directory) if entry.name.endswith('.pickle')]
+        size = sum(size for _, size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.disk_max_bytes:
+                return
+            os.remove(path)
+            size -= file_size
+
+    def load(self, data, name=''):
+        # Index for the uploaded bytes, parsing the workbook only on a miss
+        key = workbook_key(data)
+        index = self.get(key)
+        if index is None:
+            sheets = excel_ingest.read_workbook(data, skip_columns=['District'], cache=self.sheets)
+            index = self.put(key, WorkbookIndex(name, sheets))
+        return key, index